@@ -1,3 +1,11 @@
 from .ctes import *
-from .apigpio import Pi, Pulse
+from .apigpio import Pi, Pulse, WaveStreamStats, I2CZip, GpioShadow, \
+    CommandEvent, command_name
 from .utils import Debounce
+from .metrics import CommandStats
+from .i2c import I2CDevice, Register
+from .sampler import Sampler
+from .cluster import PiCluster
+from .scripts import ScriptCache, ScriptBuilder
+from .streams import SerialStream, BitBangSerialStream
+from .sync import SyncPi
@@ -1,7 +1,9 @@
+import array
 import asyncio
 import socket
 import struct
 import sys
+import time
 import functools
 from .ctes import *
 
@@ -127,6 +129,14 @@ _PI_CMD_WVCHA = 93
 
 _PI_CMD_SLRI = 94
 
+_PI_CMD_WVTXM = 100
+_PI_CMD_WVTAT = 101
+
+_PI_CMD_WVCAP = 118
+
+# largest command extension accepted by pigpiod
+_CMD_MAX_EXTENSION = 1 << 16
+
 # pigpio error text
 
 _errors = {  
@@ -252,14 +262,23 @@ _errors = {
 }
 
 
+_COMMAND_NAMES = {v: k[8:] for k, v in list(globals().items())
+                  if k.startswith('_PI_CMD_')}
+
+
 class ApigpioError(Exception):
-    """pigpio module exception"""
-    def __init__(self, value):
+    """pigpio module exception, code is the pigpio error number if any"""
+    def __init__(self, value, code=None):
         self.value = value
+        self.code = code
 
     def __str__(self):
         return repr(self.value)
 
+
+class ApigpioConnectionError(ApigpioError):
+    """The connection to pigpiod was lost, see [*set_reconnect*]."""
+
 class Pulse:
    """
    A class to store pulse information.
@@ -278,6 +297,163 @@ class Pulse:
       self.gpio_off = gpio_off
       self.delay = delay
 
+class WaveStreamStats:
+   """
+   A class to store the outcome of a [*wave_stream*] transmission.
+   """
+
+   def __init__(self):
+      """
+      Initialises empty stream statistics.
+
+          blocks:= the number of pulse blocks transmitted.
+          micros:= the total length in microseconds of the blocks.
+       underruns:= the number of times the previous wave had finished
+                   before the next block was queued.
+      """
+      self.blocks = 0
+      self.micros = 0
+      self.underruns = 0
+
+class I2CZip:
+    """
+    A class to build the steps of an [*i2c_zip*] transaction.
+
+    The builder methods return the builder so that calls can be chained.
+
+    ...
+    # write register 0x32 then read 6 bytes with a repeated start
+    zip = apigpio.I2CZip().combined().write([0x32]).read(6)
+    count, data = await pi.i2c_zip(h, zip)
+    accel, = zip.split(data)
+    ...
+    """
+
+    def __init__(self):
+        self._steps = bytearray()
+        self._reads = []
+
+    def _step(self, cmd, p):
+        if p > 255:
+            self._steps.extend((I2C_ESC, cmd, p & 0xFF, p >> 8))
+        else:
+            self._steps.extend((cmd, p))
+
+    def address(self, address):
+        """Sets the I2C address used by the following steps."""
+        self._step(I2C_ADDR, address)
+        return self
+
+    def flags(self, flags):
+        """Sets the I2C flags used by the following steps."""
+        self._steps.extend((I2C_FLAGS, flags & 0xFF, flags >> 8))
+        return self
+
+    def combined(self, on=True):
+        """
+        Switches the combined flag on or off.  While on, reads and
+        writes are chained with repeated starts instead of stops.
+        """
+        self._steps.append(I2C_COMBINED_ON if on else I2C_COMBINED_OFF)
+        return self
+
+    def write(self, data):
+        """Writes the bytes of data."""
+        data = bytes(data)
+        self._step(I2C_WRITE, len(data))
+        self._steps.extend(data)
+        return self
+
+    def read(self, count):
+        """Reads count bytes."""
+        self._step(I2C_READ, count)
+        self._reads.append(count)
+        return self
+
+    def __bytes__(self):
+        return bytes(self._steps) + bytes((I2C_END,))
+
+    def split(self, data):
+        """
+        Splits the data returned by [*i2c_zip*] into the results of
+        each read step, in order.
+        """
+        results = []
+        pos = 0
+        for count in self._reads:
+            results.append(data[pos:pos + count])
+            pos += count
+        return results
+
+class GpioShadow:
+    """
+    A client side copy of gpio modes and levels, see [*enable_shadow*].
+
+    Modes are recorded by [*set_mode*] and [*write*], which switches
+    the gpio to OUTPUT.  The levels of output gpios are recorded by
+    [*write*], [*write_many*] and the bank set and clear commands, the
+    levels of the watched gpios are updated from the notification
+    reports.
+
+    . .
+      modes: dict of gpio to the mode last set.
+     levels: dict of gpio to its known level.
+    watched: bit mask of the gpios 0-31 updated from notifications.
+       hits: number of [*read*] and [*get_mode*] calls answered locally.
+     misses: number of [*read*] and [*get_mode*] calls sent to pigpiod.
+     drifts: number of differences found by [*reconcile_shadow*].
+    . .
+    """
+
+    def __init__(self, watched=0):
+        self.modes = {}
+        self.levels = {}
+        self.watched = watched
+        self.hits = 0
+        self.misses = 0
+        self.drifts = 0
+        self._watched_gpios = [g for g in range(32) if watched & (1 << g)]
+
+    def _get(self, table, gpio):
+        if gpio in table:
+            self.hits += 1
+            return table[gpio]
+        self.misses += 1
+        return None
+
+    def _is_watched(self, gpio):
+        return gpio < 32 and self.watched & (1 << gpio)
+
+    def _set_mode(self, gpio, mode):
+        self.modes[gpio] = mode
+        if not self._is_watched(gpio):
+            # The level of a new output is unknown until written.
+            self.levels.pop(gpio, None)
+
+    def _write(self, gpio, level, ok=True):
+        if not ok:
+            if not self._is_watched(gpio):
+                self.levels.pop(gpio, None)
+        elif self.modes.get(gpio) == OUTPUT:
+            self.levels[gpio] = 1 if level else 0
+
+    def _write_bank(self, bank, bits, level, ok):
+        for i in range(32):
+            if bits & (1 << i):
+                self._write(bank * 32 + i, level, ok)
+
+    def _notified(self, level):
+        for g in self._watched_gpios:
+            self.levels[g] = (level >> g) & 1
+
+    def _tracked(self):
+        """Returns the gpios whose level is tracked."""
+        gpios = set(self.levels)
+        gpios.update(self._watched_gpios)
+        gpios.update(g for g, m in self.modes.items() if m == OUTPUT)
+        return sorted(gpios)
+
+
 def error_text(errnum):
     """
     Returns a text description of a pigpio error.
@@ -321,10 +497,226 @@ def _u2i(uint32):
     v = u2i(uint32)
     if v < 0:
         if exceptions:
-            raise ApigpioError(error_text(v))
+            raise ApigpioError(error_text(v), v)
     return v
 
 
+async def _sock_recv_into(loop, sock, buf):
+    """Receives exactly len(buf) bytes from sock into buf."""
+    view = memoryview(buf).cast('B')
+    while len(view):
+        n = await loop.sock_recv_into(sock, view)
+        if not n:
+            raise ApigpioConnectionError(error_text(PI_SOCK_READ_FAILED),
+                                         PI_SOCK_READ_FAILED)
+        view = view[n:]
+
+
+async def _open_socket(loop, address, keepalive=False):
+    """
+    Connects a non blocking TCP socket to address, with the Nagle
+    algorithm disabled and, with keepalive, a dead link detected within
+    a few seconds.
+    """
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        s.setblocking(False)
+        s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if keepalive:
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            for option, value in (('TCP_KEEPIDLE', 2), ('TCP_KEEPINTVL', 1),
+                                  ('TCP_KEEPCNT', 3)):
+                if hasattr(socket, option):
+                    s.setsockopt(socket.IPPROTO_TCP,
+                                 getattr(socket, option), value)
+        await loop.sock_connect(s, address)
+    except BaseException:
+        s.close()
+        raise
+    return s
+
+
+def command_name(cmd):
+    """Returns the pigpio name of a command number, e.g. 'MODES'."""
+    return _COMMAND_NAMES.get(cmd, str(cmd))
+
+
+# Commands whose result is unsigned, a negative value is not an error.
+_UNSIGNED_RESULTS = (_PI_CMD_BR1, _PI_CMD_BR2, _PI_CMD_TICK, _PI_CMD_HWVER)
+
+# Seconds a command in flight on a lost connection has to release the
+# command lock before being cancelled, see Pi._seize_lock.
+_SEIZE_TIMEOUT = 1.0
+
+# The settings re-applied after a reconnection, modes first, see
+# Pi.set_reconnect.
+_RESTORE_ORDER = (_PI_CMD_MODES, _PI_CMD_PUD, _PI_CMD_FG, _PI_CMD_FN,
+                  _PI_CMD_PFS, _PI_CMD_PRS, _PI_CMD_PWM, _PI_CMD_SERVO)
+
+
+class CommandEvent(object):
+    """
+    The report of a pigpio command given to a [*set_observer*]
+    observer.
+
+    . .
+          cmd: the command number.
+         name: the command name, see [*command_name*].
+    lock_wait: seconds spent waiting for the command socket.
+          rtt: seconds between sending the request and receiving the
+               response.
+     tx_bytes: number of request bytes.
+     rx_bytes: number of response bytes, extension data included.
+        error: the pigpio error code, 0 if the command succeeded.
+    . .
+
+    Commands sent in a pipelined burst share the burst lock_wait, and
+    their rtt is measured from the burst being sent.
+    """
+
+    __slots__ = ('cmd', 'name', 'lock_wait', 'rtt', 'tx_bytes',
+                 'rx_bytes', 'error')
+
+    def __init__(self, cmd, lock_wait, rtt, tx_bytes, rx_bytes, res):
+        self.cmd = cmd
+        self.name = command_name(cmd)
+        self.lock_wait = lock_wait
+        self.rtt = rtt
+        self.tx_bytes = tx_bytes
+        self.rx_bytes = rx_bytes
+        res = u2i(res)
+        self.error = res if res < 0 and cmd not in _UNSIGNED_RESULTS else 0
+
+
+class _CommandLock(object):
+    """
+    Wraps the command lock of a Pi while an observer or automatic
+    reconnection is set.
+
+    It times the waits for the lock and reports the commands run while
+    it is held, see [*set_observer*], holds back or fails the commands
+    while the connection is down and starts reconnecting when a
+    command fails on a socket error, see [*set_reconnect*].
+    """
+
+    def __init__(self, pi, lock):
+        self._pi = pi
+        self._lock = lock
+        self.events = []
+        self.owner = None
+        self._wait = 0.0
+
+    def locked(self):
+        return self._lock.locked()
+
+    async def __aenter__(self):
+        pi = self._pi
+        t = time.perf_counter()
+        while True:
+            connected = pi._connected
+            if connected is not None and \
+                    (pi._stopping or not connected.is_set()):
+                if pi._stopping or not pi._reconnect_queue:
+                    raise ApigpioConnectionError('not connected to pigpiod')
+                await connected.wait()
+                continue
+            await self._lock.acquire()
+            if pi._connected is None or pi._connected.is_set():
+                break
+            # The connection was lost while waiting for the lock.
+            self._lock.release()
+        self._wait = time.perf_counter() - t
+        self.events = []
+        self.owner = asyncio.current_task()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        events, wait = self.events, self._wait
+        self.events = []
+        self.owner = None
+        self._lock.release()
+        if exc_type is not None and \
+                issubclass(exc_type, (OSError, ApigpioConnectionError)):
+            self._pi._connection_lost()
+        self._report(events, wait)
+
+    def _flush(self):
+        """Reports the commands run while holding the raw lock."""
+        events, self.events = self.events, []
+        self._report(events, 0.0)
+
+    def _report(self, events, wait):
+        observer = self._pi._observer
+        if observer is None:
+            return
+        for cmd, tx, rx, rtt, res in events:
+            # protect the command from a faulty observer
+            try:
+                observer(CommandEvent(cmd, wait, rtt, tx, rx, res))
+            except Exception as e:
+                print('Exception raised when running observer {}'.format(e))
+
+
+def _gpio_bank(gpio):
+    """Returns the bank, 0 or 1, of a gpio 0-53."""
+    if not 0 <= gpio <= 53:
+        raise ValueError('gpio not 0-53')
+    return gpio >> 5
+
+
+_BANK_READ = (_PI_CMD_BR1, _PI_CMD_BR2)
+_BANK_SET = (_PI_CMD_BS1, _PI_CMD_BS2)
+_BANK_CLEAR = (_PI_CMD_BC1, _PI_CMD_BC2)
+
+
+def _pack_command(buf, cmd, p1, p2, p3, extents):
+    """Appends a pigpio socket command and its extents to buf."""
+    buf.extend(struct.pack('IIII', cmd, p1, p2, p3))
+    for x in extents:
+        if isinstance(x, str):
+            buf.extend(x.encode('latin-1'))
+        else:
+            buf.extend(x)
+
+
+def _chain_micros(data, wave_micros):
+    """
+    Returns the length in microseconds of a wave chain, or None if it
+    loops forever or uses a wave of unknown length.
+    """
+    data = bytes(data)
+    stack = [0]
+    i = 0
+    while i < len(data):
+        if data[i] != 255:
+            micros = wave_micros.get(data[i])
+            if micros is None:
+                return None
+            stack[-1] += micros
+            i += 1
+            continue
+        if i + 1 >= len(data):
+            return None
+        code = data[i + 1]
+        if code == 0:
+            stack.append(0)
+            i += 2
+        elif code == 3:
+            return None
+        elif code in (1, 2) and i + 3 < len(data):
+            x = data[i + 2] + data[i + 3] * 256
+            if code == 1:
+                if len(stack) < 2:
+                    return None
+                block = stack.pop()
+                stack[-1] += block * x
+            else:
+                stack[-1] += x
+            i += 4
+        else:
+            return None
+    return sum(stack)
+
+
 class _callback_ADT:
     """An ADT class to hold callback information."""
 
@@ -364,22 +756,34 @@ class _callback_handler(object):
         self.pi = pi
         self.handle = None
         self.monitor = 0
+        self.shadow_bits = 0
         self.callbacks = []
+        self.gaps = 0
+        self.last_seq = None
         self.f_stop = asyncio.Future(loop=self._loop)
         self.f_stopped = asyncio.Future(loop=self._loop)
 
     async def _connect(self, address):
-        # FIXME: duplication with pi.connect
-        self.s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        # Disable the Nagle algorithm.
-        self.s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
-        self.s.setblocking(False)
-
-        # TODO: handle connection errors !
-        await self._loop.sock_connect(self.s, address)
-        self.handle = await self._pigpio_aio_command(_PI_CMD_NOIB, 0, 0)
+        self.s = await _open_socket(self._loop, address,
+                                    self.pi._connected is not None)
+        try:
+            self.handle = await self._pigpio_aio_command(_PI_CMD_NOIB, 0, 0)
+        except BaseException:
+            self.s.close()
+            raise
+        if self.f_stopped.done():
+            # Reconnecting: the previous listener has exited.
+            self.f_stop = asyncio.Future(loop=self._loop)
+            self.f_stopped = asyncio.Future(loop=self._loop)
+        self.last_seq = None
         asyncio.ensure_future(self._wait_for_notif(), loop=self._loop)
 
+    async def _abort(self):
+        """Stops listening after the connection to pigpiod was lost."""
+        if not self.f_stop.done():
+            self.f_stop.set_result(True)
+        await self.f_stopped
+
     async def close(self):
         if not self.f_stop.done():
             self.handle = await self._pigpio_aio_command(_PI_CMD_NC,
@@ -389,24 +793,39 @@ class _callback_handler(object):
 
     async def _wait_for_notif(self):
         last_level = 0
+        MSG_SIZ = 12
+        buf = bytearray(MSG_SIZ)
 
         while True:
-            MSG_SIZ = 12
-            f_recv = asyncio.ensure_future(self._loop.sock_recv(self.s, MSG_SIZ))
+            f_recv = asyncio.ensure_future(
+                _sock_recv_into(self._loop, self.s, buf))
             done, pending = await asyncio.\
                 wait([f_recv, self.f_stop],
                      return_when=asyncio.FIRST_COMPLETED)
             if self.f_stop in done:
+                f_recv.cancel()
                 break
-            else:
-                buf = f_recv.result()
-            # buf = await self._loop.sock_recv(self.s, MSG_SIZ)
-
-            while len(buf) < MSG_SIZ:
-                await self._loop.sock_recv(self.s, MSG_SIZ-len(buf))
+            try:
+                f_recv.result()
+            except (OSError, ApigpioError):
+                self.s.close()
+                self.f_stop.set_result(True)
+                self.f_stopped.set_result(True)
+                if self.pi._connected is None:
+                    raise
+                self.pi._connection_lost()
+                return
+            if self.pi._recorder is not None:
+                self.pi._recorder.notification(buf)
 
             seq, flags, tick, level = (struct.unpack('HHII', buf))
+            if self.last_seq is not None and \
+                    seq != (self.last_seq + 1) & 0xFFFF:
+                self.gaps += 1
+            self.last_seq = seq
             if flags == 0:
+                if self.pi.shadow is not None:
+                    self.pi.shadow._notified(level)
                 changed = level ^ last_level
                 last_level = level
                 for cb in self.callbacks:
@@ -446,7 +865,7 @@ class _callback_handler(object):
         """Removes a callback."""
         if cb in self.callbacks:
             self.callbacks.remove(cb)
-            new_monitor = 0
+            new_monitor = self.shadow_bits
             for c in self.callbacks:
                 new_monitor |= c.bit
             if new_monitor != self.monitor:
@@ -454,11 +873,23 @@ class _callback_handler(object):
                 await self.pi._pigpio_aio_command(
                     _PI_CMD_NB, self.handle, self.monitor)
 
+    async def set_shadow_bits(self, bits):
+        """Sets the gpios monitored for the shadow state."""
+        self.shadow_bits = bits
+        new_monitor = bits
+        for c in self.callbacks:
+            new_monitor |= c.bit
+        if new_monitor != self.monitor:
+            self.monitor = new_monitor
+            await self.pi._pigpio_aio_command(
+                _PI_CMD_NB, self.handle, self.monitor)
+
     async def _pigpio_aio_command(self, cmd,  p1, p2,):
         # FIXME: duplication with pi._pigpio_aio_command
         data = struct.pack('IIII', cmd, p1, p2, 0)
         await self._loop.sock_sendall(self.s, data)
-        response = await self._loop.sock_recv(self.s, 16)
+        response = bytearray(16)
+        await _sock_recv_into(self._loop, self.s, response)
         _, res = struct.unpack('12sI', response)
         return res
 
@@ -508,9 +939,11 @@ class Pi(object):
         """
         async with self._lock:
             data = struct.pack('IIII', cmd, p1, p2, 0)
-            await self._loop.sock_sendall(self.s, data)
-            response = await self._loop.sock_recv(self.s, 16)
-            _, res = struct.unpack('12sI', response)
+            t = time.perf_counter() if self._observer is not None else None
+            await self._send(data)
+            res = await self._recv_result()
+            if t is not None:
+                self._observe(cmd, 16, t, res)
             return res
     
     async def _pigpio_aio_command_ext(self, cmd, p1, p2, p3, extents):
@@ -529,15 +962,111 @@ class Pi(object):
 
     async def _pigpio_aio_command_ext_unlocked(self, cmd, p1, p2, p3, extents):
         """Run extended pigpio socket command without any lock."""
-        ext = bytearray(struct.pack('IIII', cmd, p1, p2, p3))
-        for x in extents:
-            if isinstance(x, str):
-                ext.extend(x.encode('latin-1'))
-            else:
-                ext.extend(x)
-        await self._loop.sock_sendall(self.s, ext)
-        response = await self._loop.sock_recv(self.s, 16)
-        _, res = struct.unpack('12sI', response)
+        ext = bytearray()
+        _pack_command(ext, cmd, p1, p2, p3, extents)
+        t = time.perf_counter() if self._observer is not None else None
+        await self._send(ext)
+        res = await self._recv_result()
+        if t is not None:
+            self._observe(cmd, len(ext), t, res)
+        return res
+
+    async def _pigpio_aio_command_pipeline(self, commands):
+        """
+        Runs several pigpio socket commands in a single round trip.
+
+        commands:= list of (cmd, p1, p2, p3, extents) tuples, see
+                   _pigpio_aio_command_ext.
+
+        All commands are sent in one write and the results are then
+        read in order, which is only valid for commands whose response
+        is the plain 16 bytes reply.
+
+        Returns the list of raw results.
+        """
+        async with self._lock:
+            return (await self._pigpio_aio_command_pipeline_unlocked(
+                commands))
+
+    async def _pigpio_aio_command_pipeline_unlocked(self, commands):
+        """Run pipelined pigpio socket commands without any lock."""
+        data = bytearray()
+        for cmd, p1, p2, p3, extents in commands:
+            _pack_command(data, cmd, p1, p2, p3, extents)
+        t = time.perf_counter() if self._observer is not None else None
+        await self._send(data)
+        results = []
+        for cmd, p1, p2, p3, extents in commands:
+            res = await self._recv_result()
+            if t is not None:
+                self._observe(cmd, 16 + p3, t, res)
+            results.append(res)
+        return results
+
+    def _observe(self, cmd, tx_bytes, sent, res):
+        """Records a command for the observer, see _CommandLock."""
+        if isinstance(self._lock, _CommandLock):
+            self._lock.events.append(
+                [cmd, tx_bytes, 16, time.perf_counter() - sent, res])
+
+    def set_observer(self, observer):
+        """
+        Sets a function called with a [*CommandEvent*] for each pigpio
+        command sent on the command socket.
+
+        observer:= a function taking a [*CommandEvent*], e.g. a
+                   [*CommandStats*], or None to stop observing.
+
+        The observer is called once the command socket has been
+        released.  When no observer is set the commands are not
+        timed at all.
+
+        ...
+        stats = apigpio.CommandStats()
+        pi.set_observer(stats)
+        await run_application(pi)
+        print(stats.report())
+        ...
+        """
+        self._observer = observer
+        self._set_lock()
+
+    def _set_lock(self):
+        """Wraps the command lock when an observer or reconnection is set."""
+        if self._observer is None and self._connected is None:
+            self._lock = self._raw_lock
+        elif not isinstance(self._lock, _CommandLock):
+            self._lock = _CommandLock(self, self._raw_lock)
+
+    def set_recorder(self, recorder):
+        """
+        Records the traffic of the command and notification sockets.
+
+        recorder:= an apigpio.recording.Recorder, or None to stop
+                   recording.
+
+        See apigpio.recording for replaying a recording.
+
+        ...
+        from apigpio import recording
+
+        pi.set_recorder(recording.Recorder('site.rec'))
+        ...
+        """
+        self._recorder = recorder
+
+    async def _send(self, data):
+        """Sends request bytes on the command socket."""
+        if self._recorder is not None:
+            self._recorder.request(data)
+        await self._loop.sock_sendall(self.s, data)
+
+    async def _recv_result(self):
+        """Receives a command response and returns its result."""
+        await _sock_recv_into(self._loop, self.s, self._response)
+        if self._recorder is not None:
+            self._recorder.response(self._response)
+        _, res = struct.unpack('12sI', self._response)
         return res
     
     async def connect(self, address):
@@ -547,20 +1076,166 @@ class Pi(object):
         resolved (for example an ip address)
         :return:
         """
-        self.s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.s.setblocking(False)
-        # Disable the Nagle algorithm.
-        self.s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._address = address
+        self.s = await _open_socket(self._loop, address,
+                                    self._connected is not None)
+        await self._notify._connect(address)
 
-        await self._loop.sock_connect(self.s, address)
+    def set_reconnect(self, enabled=True, queue=True, min_delay=0.1,
+                      max_delay=5.0, resync_cb=None, timeout=5.0):
+        """
+        Reconnects automatically when the connection to pigpiod is
+        lost, e.g. pigpiod restarting or the network going down.
+
+          enabled:= True to reconnect, False to stop reconnecting.
+            queue:= True to hold the commands issued while the
+                     connection is down until it is restored, False to
+                     fail them at once with an ApigpioConnectionError.
+        min_delay:= seconds before the first reconnection attempt.
+        max_delay:= longest delay between attempts, the delay doubles
+                     after each failed attempt.
+        resync_cb:= a function called without argument once the
+                     connection and the state are restored.
+          timeout:= seconds an attempt has to connect, reopen the
+                     notifications and restore the state before it is
+                     abandoned, e.g. when the host does not answer.
+
+        Call before [*connect*] so that TCP keepalive detects a dead
+        link within a few seconds even when no command is sent.
+
+        Once reconnected the notification handle is reopened and the
+        gpios monitored for callbacks are notified again.  The gpio
+        modes, pulls, glitch and noise filters, PWM frequencies,
+        ranges and dutycycles and servo pulsewidths set since
+        reconnection was enabled are re-applied in a single burst,
+        pigpiod having lost them if it restarted.  A shadow state,
+        see [*enable_shadow*], is then reconciled.
+
+        The command being run when the connection is lost raises an
+        ApigpioConnectionError or an OSError rather than being
+        retried.  Scripts, waves, serial and I2C/SPI handles and the
+        user notification handles are not restored.
+
+        ...
+        pi = apigpio.Pi()
+        pi.set_reconnect(resync_cb=lambda: print('resynchronised'))
+        await pi.connect(address)
+        ...
+        """
+        if not enabled:
+            self._connected = None
+            self._restore = None
+        elif self._connected is None:
+            self._connected = asyncio.Event()
+            self._connected.set()
+            self._restore = {}
+        self._reconnect_queue = queue
+        self._reconnect_delays = (min_delay, max_delay)
+        self._reconnect_timeout = timeout
+        self._resync_cb = resync_cb
+        self._set_lock()
+
+    def _remember(self, res, cmd, gpio, p2, p3=0, extents=()):
+        """Records a setting to re-apply after a reconnection."""
+        if self._restore is None or u2i(res) < 0:
+            return
+        if cmd in (_PI_CMD_MODES, _PI_CMD_PWM, _PI_CMD_SERVO):
+            self._forget_pulses(gpio)
+        self._restore[(cmd, gpio)] = (cmd, gpio, p2, p3, extents)
+
+    def _forget_pulses(self, gpio):
+        """Forgets the PWM and servo pulses of a gpio, switched off."""
+        self._restore.pop((_PI_CMD_PWM, gpio), None)
+        self._restore.pop((_PI_CMD_SERVO, gpio), None)
+
+    def _connection_lost(self):
+        """Starts reconnecting after a socket failure."""
+        if self._connected is None or self._stopping or \
+                not self._connected.is_set():
+            return
+        self._connected.clear()
+        self._reconnect_task = asyncio.ensure_future(self._reconnect())
+
+    async def _reconnect(self):
+        """Reconnects with an exponential backoff and restores the state."""
+        delay, max_delay = self._reconnect_delays
+        await self._notify._abort()
+        await self._seize_lock()
+        try:
+            self.s.close()
+            while True:
+                await asyncio.sleep(delay)
+                try:
+                    await asyncio.wait_for(self._reconnect_attempt(),
+                                           self._reconnect_timeout)
+                    break
+                except (OSError, ApigpioError, asyncio.TimeoutError):
+                    self.s.close()
+                    await self._notify._abort()
+                    delay = min(delay * 2, max_delay)
+        finally:
+            self._raw_lock.release()
+            # The restore burst was recorded without the lock wrapper.
+            self._lock._flush()
+        self.reconnects += 1
+        self._connected.set()
+        if self._resync_cb is not None:
+            self._resync_cb()
+        if self.shadow is not None:
+            await self.reconcile_shadow()
+
+    async def _reconnect_attempt(self):
+        self.s = await _open_socket(self._loop, self._address, True)
+        await self._notify._connect(self._address)
+        await self._restore_state()
+
+    async def _seize_lock(self):
+        """
+        Takes the command lock from the command in flight on the lost
+        connection, if any.
+
+        Shutting the socket down fails its pending read with an
+        ApigpioConnectionError, so that the command releases the lock.
+        A command still holding it after _SEIZE_TIMEOUT seconds is
+        cancelled.
+        """
+        try:
+            self.s.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        try:
+            await asyncio.wait_for(self._raw_lock.acquire(), _SEIZE_TIMEOUT)
+        except asyncio.TimeoutError:
+            if self._lock.owner is not None:
+                self._lock.owner.cancel()
+            await self._raw_lock.acquire()
+
+    async def _restore_state(self):
+        """
+        Re-applies the recorded settings in a single burst, the
+        command lock being held.
+        """
+        commands = sorted(self._restore.values(),
+                          key=lambda c: _RESTORE_ORDER.index(c[0]))
+        if self._notify.monitor:
+            commands.append((_PI_CMD_NB, self._notify.handle,
+                             self._notify.monitor, 0, ()))
+        if commands:
+            await self._pigpio_aio_command_pipeline_unlocked(commands)
 
-        await self._notify._connect(address)
-    
     async def stop(self):
         """
 
         :return:
         """
+        self._stopping = True
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+        if self._connected is not None:
+            # Fails the commands held back while reconnecting.
+            self._connected.set()
+        if self._shadow_task is not None:
+            self._shadow_task.cancel()
         print('closing notifier')
         await self._notify.close()
         print('closing socket')
@@ -579,6 +1254,25 @@ class Pi(object):
         ...
         """
         res = await self._pigpio_aio_command(_PI_CMD_PIGPV, 0, 0)
+
+    async def get_current_tick(self):
+        """
+        Returns the current system tick.
+
+        Tick is the number of microseconds since system boot.
+
+        As tick is an unsigned 32 bit quantity it wraps around after
+        2**32 microseconds, which is approximately 1 hour 12 minutes.
+
+        See apigpio.clock.TickClock to convert ticks to the host clock.
+
+        ...
+        t1 = await pi.get_current_tick()
+        await asyncio.sleep(1)
+        t2 = await pi.get_current_tick()
+        ...
+        """
+        return await self._pigpio_aio_command(_PI_CMD_TICK, 0, 0)
     
     async def store_script(self, script):
         """
@@ -659,18 +1353,16 @@ class Pi(object):
         (s, pars) = pi.script_status(sid)
         ...
         """
-        res = await self._pigpio_aio_command(_PI_CMD_PROCP, script_id, 0)
-        bytes = u2i(res)
+        async with self._lock:
+            res = await self._pigpio_aio_command_ext_unlocked(
+                _PI_CMD_PROCP, script_id, 0, 0, [])
+            return (await self._script_status_reply(res))
 
+    async def _script_status_reply(self, res):
+        """Receives the parameters following a PROCP response."""
+        bytes = u2i(res)
         if bytes > 0:
-
-            # Fixme : this sould be the same a _rxbuf
-            # data = self._rxbuf(bytes)
-            data = await self._loop.sock_recv(self.s, bytes)
-            while len(data) < bytes:
-                b = await self._loop.sock_recv(self.s, bytes-len(data))
-                data.extend(b)
-
+            data = await self._rxbuf(bytes, self._script_params)
             pars = struct.unpack('11i', data)
             status = pars[0]
             params = pars[1:]
@@ -678,6 +1370,75 @@ class Pi(object):
             status = bytes
             params = ()
         return status, params
+
+    async def script_statuses(self, script_ids):
+        """
+        Returns the run status and parameters of several scripts in a
+        single round trip.
+
+        script_ids:= list of ids of stored scripts.
+
+        Returns a list of (status, params) tuples, as returned by
+        [*script_status*], in the order of script_ids.
+
+        ...
+        for sid, (s, pars) in zip(sids, await pi.script_statuses(sids)):
+            if s == apigpio.PI_SCRIPT_FAILED:
+                print('script {} failed'.format(sid))
+        ...
+        """
+        data = bytearray()
+        for script_id in script_ids:
+            _pack_command(data, _PI_CMD_PROCP, script_id, 0, 0, [])
+        statuses = []
+        async with self._lock:
+            t = time.perf_counter() if self._observer is not None else None
+            await self._send(data)
+            for _ in script_ids:
+                res = await self._recv_result()
+                if t is not None:
+                    self._observe(_PI_CMD_PROCP, 16, t, res)
+                statuses.append(await self._script_status_reply(res))
+        return statuses
+
+    async def wait_script(self, script_id, timeout=None, poll=0.001,
+                          max_poll=0.1):
+        """
+        Waits for a script to stop running.
+
+        script_id:= id of stored script.
+          timeout:= maximum wait in seconds, None to wait forever.
+             poll:= first polling interval in seconds.
+         max_poll:= maximum polling interval in seconds.
+
+        The script status is polled with an interval doubling from
+        poll up to max_poll, so that a short script is seen halting
+        quickly while a long one costs few round trips.
+
+        Returns the final run status and parameters, as returned by
+        [*script_status*].  Raises asyncio.TimeoutError if the script
+        is still running after timeout seconds.
+
+        ...
+        await pi.run_script(sid, [100])
+        status, pars = await pi.wait_script(sid, timeout=5)
+        ...
+        """
+        if timeout is not None:
+            deadline = self._loop.time() + timeout
+        while True:
+            status, params = await self.script_status(script_id)
+            if status not in (PI_SCRIPT_INITING, PI_SCRIPT_RUNNING,
+                              PI_SCRIPT_WAITING):
+                return status, params
+            delay = poll
+            if timeout is not None:
+                remaining = deadline - self._loop.time()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                delay = min(delay, remaining)
+            await asyncio.sleep(delay)
+            poll = min(poll * 2, max_poll)
     
     async def stop_script(self, script_id):
         """
@@ -735,6 +1496,8 @@ class Pi(object):
         ...
         """
         res = await self._pigpio_aio_command(_PI_CMD_BC1, bits, 0)
+        if self.shadow is not None:
+            self.shadow._write_bank(0, bits, 0, u2i(res) >= 0)
         return _u2i(res)
 
     async def set_bank_1(self, bits):
@@ -752,7 +1515,206 @@ class Pi(object):
         ...
         """
         res = await self._pigpio_aio_command(_PI_CMD_BS1, bits, 0)
+        if self.shadow is not None:
+            self.shadow._write_bank(0, bits, 1, u2i(res) >= 0)
+        return _u2i(res)
+
+    async def read_bank_2(self):
+        """
+        Returns the levels of the bank 2 gpios (gpios 32-53).
+
+        The returned 32 bit integer has a bit set if the corresponding
+        gpio is high.  Gpio n has bit value (1<<(n-32)).
+
+        ...
+        print(bin(await pi.read_bank_2()))
+        0b1111110000000000000000
+        ...
+        """
+        res = await self._pigpio_aio_command(_PI_CMD_BR2, 0, 0)
+        return res
+
+    async def clear_bank_2(self, bits):
+        """
+        Clears gpios 32-53 if the corresponding bit (0-21) in bits is set.
+
+        bits:= a 32 bit mask with 1 set if the corresponding gpio is
+             to be cleared.
+
+        A returned status of PI_SOME_PERMITTED indicates that the user
+        is not allowed to write to one or more of the gpios.
+
+        ...
+        await pi.clear_bank_2(0x1010)
+        ...
+        """
+        res = await self._pigpio_aio_command(_PI_CMD_BC2, bits, 0)
+        if self.shadow is not None:
+            self.shadow._write_bank(1, bits, 0, u2i(res) >= 0)
         return _u2i(res)
+
+    async def set_bank_2(self, bits):
+        """
+        Sets gpios 32-53 if the corresponding bit (0-21) in bits is set.
+
+        bits:= a 32 bit mask with 1 set if the corresponding gpio is
+             to be set.
+
+        A returned status of PI_SOME_PERMITTED indicates that the user
+        is not allowed to write to one or more of the gpios.
+
+        ...
+        await pi.set_bank_2(0x303)
+        ...
+        """
+        res = await self._pigpio_aio_command(_PI_CMD_BS2, bits, 0)
+        if self.shadow is not None:
+            self.shadow._write_bank(1, bits, 1, u2i(res) >= 0)
+        return _u2i(res)
+
+    async def read_many(self, gpios):
+        """
+        Returns the levels of several gpios.
+
+        gpios:= iterable of gpios 0-53.
+
+        The levels are read with [*read_bank_1*] and [*read_bank_2*],
+        only the banks holding the requested gpios are read and both
+        reads are sent in a single round trip.
+
+        Returns a dict of gpio to level.
+
+        ...
+        levels = await pi.read_many([4, 17, 27, 40])
+        print(levels[17])
+        1
+        ...
+        """
+        gpios = list(gpios)
+        banks = sorted(set(_gpio_bank(g) for g in gpios))
+        results = await self._pigpio_aio_command_pipeline(
+            [(_BANK_READ[b], 0, 0, 0, []) for b in banks])
+        levels = dict(zip(banks, results))
+        return {g: (levels[g >> 5] >> (g & 31)) & 1 for g in gpios}
+
+    async def write_many(self, levels):
+        """
+        Sets the levels of several gpios.
+
+        levels:= dict of gpio 0-53 to level 0, 1.
+
+        The gpios are written with at most one set and one clear bank
+        command per bank, see [*set_bank_1*] and [*set_bank_2*], all
+        sent in a single round trip.  The gpios are therefore not
+        all switched at the same instant.
+
+        Returns a dict of gpio to the status of the bank command which
+        wrote it.  If exceptions are enabled an error raises after all
+        the commands have been sent.  A level other than 0 or 1 raises
+        PI_BAD_LEVEL before anything is sent.
+
+        ...
+        await pi.write_many({17: 1, 18: 0, 27: 1, 40: 0})
+        ...
+        """
+        status = await self._write_banks(levels)
+        for res in status.values():
+            _u2i(res)
+        return status
+
+    async def _write_banks(self, levels):
+        """
+        Writes a dict of gpio to level with pipelined bank commands and
+        returns a dict of gpio to the signed status of its command.
+        """
+        for level in levels.values():
+            if level not in (0, 1):
+                # Rejected as a plain write, before anything is sent.
+                raise ApigpioError(error_text(PI_BAD_LEVEL), PI_BAD_LEVEL)
+        cmds = {}
+        masks = {}
+        for g, level in levels.items():
+            bank = _gpio_bank(g)
+            cmds[g] = _BANK_SET[bank] if level else _BANK_CLEAR[bank]
+            masks[cmds[g]] = masks.get(cmds[g], 0) | (1 << (g & 31))
+        results = await self._pigpio_aio_command_pipeline(
+            [(cmd, bits, 0, 0, []) for cmd, bits in masks.items()])
+        results = dict(zip(masks, results))
+        status = {g: u2i(results[cmd]) for g, cmd in cmds.items()}
+        if self.shadow is not None:
+            for g, res in status.items():
+                self.shadow._write(g, levels[g], res >= 0)
+        return status
+
+    def set_write_coalescing(self, enabled=True, window=0):
+        """
+        Enables or disables the coalescing of [*write*] calls.
+
+        enabled:= True to coalesce writes, False to send each write
+                  on its own.
+         window:= microseconds during which writes are gathered after
+                  the first one, 0 to gather only the writes made in
+                  the same event loop iteration.
+
+        When enabled, the gathered writes are sent as bank set and
+        clear commands, see [*write_many*], so that concurrent writes
+        to different gpios cost a single round trip and land
+        together.  If a gpio is written several times in a window the
+        last level wins, every caller gets the status of the command
+        which wrote the gpio.
+
+        Unlike a plain [*write*], a coalesced write neither switches
+        the gpio to OUTPUT nor switches off PWM or servo pulses active
+        on the gpio: the gpio must already be set as an output with
+        [*set_mode*].
+
+        ...
+        pi.set_write_coalescing(window=200)
+        await asyncio.gather(pi.write(17, 1), pi.write(18, 0),
+                             pi.write(40, 1))
+        ...
+        """
+        self._coalesce_window = window if enabled else None
+
+    async def _write_coalesced(self, gpio, level):
+        _gpio_bank(gpio)
+        if level not in (0, 1):
+            # As a plain write, which pigpiod would reject.
+            return _u2i(PI_BAD_LEVEL)
+        if self._pending_writes is None:
+            self._pending_writes = ({}, [])
+            if self._coalesce_window:
+                self._loop.call_later(self._coalesce_window / 1e6,
+                                      self._flush_writes)
+            else:
+                self._loop.call_soon(self._flush_writes)
+        levels, waiters = self._pending_writes
+        levels[gpio] = level
+        fut = self._loop.create_future()
+        waiters.append((gpio, fut))
+        return await fut
+
+    def _flush_writes(self):
+        levels, waiters = self._pending_writes
+        self._pending_writes = None
+        asyncio.ensure_future(self._send_writes(levels, waiters))
+
+    async def _send_writes(self, levels, waiters):
+        try:
+            status = await self._write_banks(levels)
+        except Exception as e:
+            for _, fut in waiters:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        for gpio, fut in waiters:
+            if fut.done():
+                continue
+            if status[gpio] < 0 and exceptions:
+                fut.set_exception(ApigpioError(error_text(status[gpio]),
+                                               status[gpio]))
+            else:
+                fut.set_result(status[gpio])
  
     async def set_mode(self, gpio, mode):
         """
@@ -768,6 +1730,9 @@ class Pi(object):
         ...
         """
         res = await self._pigpio_aio_command(_PI_CMD_MODES, gpio, mode)
+        if self.shadow is not None and u2i(res) >= 0:
+            self.shadow._set_mode(gpio, mode)
+        self._remember(res, _PI_CMD_MODES, gpio, mode)
         return _u2i(res)
     
     async def set_pull_up_down(self, gpio, pud):
@@ -782,6 +1747,7 @@ class Pi(object):
         ...
         """
         res = await self._pigpio_aio_command(_PI_CMD_PUD, gpio, pud)
+        self._remember(res, _PI_CMD_PUD, gpio, pud)
         return _u2i(res)
 
     async def get_mode(self, gpio):
@@ -808,6 +1774,10 @@ class Pi(object):
         4
         ...
         """
+        if self.shadow is not None:
+            mode = self.shadow._get(self.shadow.modes, gpio)
+            if mode is not None:
+                return mode
         res = await self._pigpio_aio_command(_PI_CMD_MODEG, gpio, 0)
         return _u2i(res)
 
@@ -832,8 +1802,19 @@ class Pi(object):
         print(pi.read(17))
         1
         ...
+
+        See [*set_write_coalescing*] to merge concurrent writes.
         """
+        if self._coalesce_window is not None:
+            return await self._write_coalesced(gpio, level)
         res = await self._pigpio_aio_command(_PI_CMD_WRITE, gpio, level)
+        if self.shadow is not None:
+            if u2i(res) >= 0:
+                # pigpiod switches a written gpio to OUTPUT.
+                self.shadow._set_mode(gpio, OUTPUT)
+            self.shadow._write(gpio, level, u2i(res) >= 0)
+        # pigpiod switches a written gpio to OUTPUT, stopping its pulses.
+        self._remember(res, _PI_CMD_MODES, gpio, OUTPUT)
         return _u2i(res)
     
     async def read(self, gpio):
@@ -850,8 +1831,115 @@ class Pi(object):
         1
         ...
         """
+        if self.shadow is not None:
+            level = self.shadow._get(self.shadow.levels, gpio)
+            if level is not None:
+                return level
         res = await self._pigpio_aio_command(_PI_CMD_READ, gpio, 0)
         return _u2i(res)
+
+    async def enable_shadow(self, watch=(), interval=None, drift_cb=None):
+        """
+        Keeps a client side shadow of gpio modes and levels, so that
+        [*get_mode*] and [*read*] are answered without a round trip
+        for the gpios whose state is known.
+
+           watch:= iterable of gpios 0-31 whose levels are tracked
+                   from the notification reports, typically inputs.
+        interval:= seconds between automatic [*reconcile_shadow*]
+                   calls, None to only reconcile on demand.
+        drift_cb:= called with the level and mode drifts found by the
+                   automatic reconciliations, if any.
+
+        Modes are known once set with [*set_mode*], output levels
+        once written.  The shadow is only as good as the assumption
+        that this Pi is the only writer: changes made by other
+        clients, scripts, waves or PWM, and the notification latency,
+        are only caught by reconciliation.
+
+        Returns the [*GpioShadow*].
+
+        ...
+        shadow = await pi.enable_shadow(watch=[4, 5], interval=1.0)
+        await pi.set_mode(17, apigpio.OUTPUT)
+        await pi.write(17, 1)
+        print(await pi.read(17), await pi.read(4)) # no round trip
+        ...
+        """
+        watched = 0
+        for g in watch:
+            if not 0 <= g <= 31:
+                raise ValueError('watched gpio not 0-31')
+            watched |= 1 << g
+        await self.disable_shadow()
+        self.shadow = GpioShadow(watched)
+        await self._notify.set_shadow_bits(watched)
+        await self.reconcile_shadow()
+        if interval is not None:
+            self._shadow_task = asyncio.ensure_future(
+                self._reconcile_shadow_every(interval, drift_cb))
+        return self.shadow
+
+    async def disable_shadow(self):
+        """Stops keeping the shadow state, see [*enable_shadow*]."""
+        if self._shadow_task is not None:
+            self._shadow_task.cancel()
+            self._shadow_task = None
+        if self.shadow is not None:
+            self.shadow = None
+            await self._notify.set_shadow_bits(0)
+
+    async def reconcile_shadow(self):
+        """
+        Compares the shadow state with the gpios and corrects it.
+
+        The banks holding tracked levels and the tracked modes are
+        read in a single round trip.
+
+        Returns a tuple of two dicts, of gpio to (shadow level, actual
+        level) and of gpio to (shadow mode, actual mode), holding the
+        differences found.
+
+        ...
+        levels, modes = await pi.reconcile_shadow()
+        for gpio, (expected, actual) in levels.items():
+            print('gpio {} is {} not {}'.format(gpio, actual, expected))
+        ...
+        """
+        shadow = self.shadow
+        if shadow is None:
+            raise ApigpioError('shadow state not enabled, see enable_shadow')
+        gpios = shadow._tracked()
+        banks = sorted(set(g >> 5 for g in gpios))
+        mode_gpios = sorted(shadow.modes)
+        results = await self._pigpio_aio_command_pipeline(
+            [(_BANK_READ[b], 0, 0, 0, []) for b in banks] +
+            [(_PI_CMD_MODEG, g, 0, 0, []) for g in mode_gpios])
+        bank_levels = dict(zip(banks, results))
+        # Modes first, setting a mode forgets the level of the gpio.
+        expected_levels = dict(shadow.levels)
+        mode_drift = {}
+        for g, res in zip(mode_gpios, results[len(banks):]):
+            actual = _u2i(res)
+            if shadow.modes[g] != actual:
+                mode_drift[g] = (shadow.modes[g], actual)
+                shadow._set_mode(g, actual)
+        level_drift = {}
+        for g in gpios:
+            actual = (bank_levels[g >> 5] >> (g & 31)) & 1
+            expected = expected_levels.get(g)
+            if expected is not None and expected != actual:
+                level_drift[g] = (expected, actual)
+            shadow.levels[g] = actual
+        shadow.drifts += len(level_drift) + len(mode_drift)
+        return level_drift, mode_drift
+
+    async def _reconcile_shadow_every(self, interval, drift_cb):
+        while True:
+            await asyncio.sleep(interval)
+            level_drift, mode_drift = await self.reconcile_shadow()
+            if drift_cb is not None and (level_drift or mode_drift):
+                drift_cb(level_drift, mode_drift)
     
     async def gpio_trigger(self, user_gpio, pulse_len=10, level=1):
         """
@@ -897,6 +1985,7 @@ class Pi(object):
         ...
         """
         res = await self._pigpio_aio_command(_PI_CMD_FG, user_gpio, steady)
+        self._remember(res, _PI_CMD_FG, user_gpio, steady)
         return _u2i(res)
   
     async def set_noise_filter(self, user_gpio, steady, active):
@@ -931,6 +2020,7 @@ class Pi(object):
         extents = [struct.pack("I", active)]
         res = await self._pigpio_aio_command_ext(_PI_CMD_FN, user_gpio,
                                                       steady, 4, extents)
+        self._remember(res, _PI_CMD_FN, user_gpio, steady, 4, extents)
         return _u2i(res)
  
     async def set_PWM_dutycycle(self, user_gpio, dutycycle):
@@ -948,6 +2038,7 @@ class Pi(object):
         ...
         """
         res = await self._pigpio_aio_command(_PI_CMD_PWM, user_gpio, int(dutycycle))
+        self._remember(res, _PI_CMD_PWM, user_gpio, int(dutycycle))
         return _u2i(res)
     
     async def get_PWM_dutycycle(self, user_gpio):
@@ -985,6 +2076,7 @@ class Pi(object):
         ...
         """
         res = await self._pigpio_aio_command(_PI_CMD_PRS, user_gpio, range_)
+        self._remember(res, _PI_CMD_PRS, user_gpio, range_)
         return _u2i(res)
    
     async def get_PWM_range(self, user_gpio):
@@ -1062,6 +2154,7 @@ class Pi(object):
         ...
         """
         res = await self._pigpio_aio_command(_PI_CMD_PFS, user_gpio, frequency)
+        self._remember(res, _PI_CMD_PFS, user_gpio, frequency)
         return _u2i(res)
   
     async def get_PWM_frequency(self, user_gpio):
@@ -1216,6 +2309,15 @@ class Pi(object):
 
         return cb
 
+    def notification_gaps(self):
+        """
+        Returns the number of gaps in the sequence numbers of the
+        notification reports received, i.e. the number of times
+        pigpiod dropped reports because they were not read fast
+        enough.
+        """
+        return self._notify.gaps
+
     async def notify_open(self):
         """
         Returns a notification handle (>=0).
@@ -1359,6 +2461,7 @@ class Pi(object):
         ...
         """
         res = await self._pigpio_aio_command(_PI_CMD_SERVO, user_gpio, int(pulsewidth))
+        self._remember(res, _PI_CMD_SERVO, user_gpio, int(pulsewidth))
         return _u2i(res)
     
     async def wave_clear(self):
@@ -1371,6 +2474,7 @@ class Pi(object):
         ...
         """
         res = await self._pigpio_aio_command(_PI_CMD_WVCLR, 0, 0)
+        self._wave_micros.clear()
         return _u2i(res)
 
     async def wave_add_new(self):
@@ -1392,10 +2496,15 @@ class Pi(object):
         """
         Adds a list of pulses to the current waveform.
 
-        pulses:= list of pulses to add to the waveform.
+        pulses:= list of pulses to add to the waveform, or a buffer of
+                 unsigned 32 bit on/off/delay triplets such as the
+                 (n, 3) uint32 NumPy arrays built by [*apigpio.wavegen*].
 
         Returns the new total number of pulses in the current waveform.
 
+        Data too large for a single pigpiod command is transparently
+        split in several commands, sent in a single round trip.
+
         The pulses are interleaved in time order within the existing
         waveform (if any).
 
@@ -1456,16 +2565,44 @@ class Pi(object):
         # I p3 pulses * 12
         ## extension ##
         # III on/off/delay * pulses
-        if len(pulses):
-           ext = bytearray()
+        #
+        # Large lists are split in several commands under the pigpiod
+        # extension limit, each part but the first starting with a
+        # delay-only pulse so that it is merged after the previous ones.
+        try:
+           view = memoryview(pulses)
+        except TypeError:
+           view = None
+        if view is None:
+           flat = array.array('I')
            for p in pulses:
-              ext.extend(struct.pack("III", p.gpio_on, p.gpio_off, p.delay))
-           extents = [ext]
-           res = await self._pigpio_aio_command_ext(
-              _PI_CMD_WVAG, 0, 0, len(pulses)*12, extents)
-           return _u2i(res)
+              flat.extend((p.gpio_on, p.gpio_off, p.delay))
         else:
+           if view.itemsize != 4 or view.format.lstrip('@=') not in ('I', 'L'):
+              raise TypeError('pulse buffer items are {!r}, not unsigned 32'
+                              ' bit'.format(view.format))
+           flat = view.cast('B').cast('I')
+           if len(flat) % 3:
+              raise ValueError('pulse buffer is not made of on/off/delay'
+                               ' triplets')
+        if not len(flat):
            return 0
+        step = (_CMD_MAX_EXTENSION // 12 - 1) * 3
+        commands = []
+        start = 0
+        for i in range(0, len(flat), step):
+           chunk = flat[i:i + step]
+           size = len(chunk) * 4
+           extents = [chunk]
+           if i:
+              extents.insert(0, struct.pack("III", 0, 0, start))
+              size += 12
+           start += sum(chunk[2::3])
+           commands.append((_PI_CMD_WVAG, 0, 0, size, extents))
+        results = await self._pigpio_aio_command_pipeline(commands)
+        for res in results:
+           _u2i(res)
+        return _u2i(results[-1])
 
     async def wave_add_serial(
         self, user_gpio, baud, data, offset=0, bb_bits=8, bb_stop=2):
@@ -1485,6 +2622,9 @@ class Pi(object):
 
         Returns the new total number of pulses in the current waveform.
 
+        Data too large for a single pigpiod command is transparently
+        split in several commands, sent in a single round trip.
+
         The serial data is formatted as one start bit, [*bb_bits*]
         data bits, and [*bb_stop*]/2 stop bits.
 
@@ -1517,13 +2657,35 @@ class Pi(object):
         # I bb_stop
         # I offset
         # s len data bytes
-        if len(data):
-           extents = [struct.pack("III", bb_bits, bb_stop, offset), data]
-           res = await self._pigpio_aio_command_ext(
-              _PI_CMD_WVAS, user_gpio, baud, len(data)+12, extents)
-           return _u2i(res)
-        else:
+        #
+        # Large data is split in several commands under the pigpiod
+        # extension limit, the offset of each part being moved by the
+        # duration of the characters before it.
+        if not len(data):
            return 0
+        if isinstance(data, str):
+           data = data.encode('latin-1')
+        else:
+           data = bytes(data)
+        if bb_bits <= 8:
+           char_bytes = 1
+        elif bb_bits <= 16:
+           char_bytes = 2
+        else:
+           char_bytes = 4
+        char_micros = (1 + bb_bits + bb_stop / 2) * 1000000 / baud
+        step = (_CMD_MAX_EXTENSION - 12) // 4 * 4
+        commands = []
+        for i in range(0, len(data), step):
+           chunk = data[i:i + step]
+           start = offset + int(round(i // char_bytes * char_micros))
+           extents = [struct.pack("III", bb_bits, bb_stop, start), chunk]
+           commands.append(
+              (_PI_CMD_WVAS, user_gpio, baud, len(chunk) + 12, extents))
+        results = await self._pigpio_aio_command_pipeline(commands)
+        for res in results:
+           _u2i(res)
+        return _u2i(results[-1])
 
     async def wave_create(self):
         """
@@ -1566,12 +2728,18 @@ class Pi(object):
         When a waveform is started each pulse is executed in order with
         the specified delay between the pulse and the next.
 
+        ...
+        The length of the waveform is fetched in the same round trip
+        and recorded for [*wave_wait*] and [*chain_wait*].
+
         ...
         wid = pi.wave_create()
         ...
         """
-        res = await self._pigpio_aio_command(_PI_CMD_WVCRE, 0, 0)
-        return _u2i(res)
+        micros, res = await self._pigpio_aio_command_pipeline([
+            (_PI_CMD_WVSM, 0, 0, 0, []),
+            (_PI_CMD_WVCRE, 0, 0, 0, [])])
+        return self._wave_created(res, micros)
 
     async def wave_create_and_pad(self, percent):
         """
@@ -1616,8 +2784,16 @@ class Pi(object):
         wid = pi.wave_create_and_pad(50)
         ...
         """
-        res = await self._pigpio_aio_command(_PI_CMD_WVCAP, percent, 0)
-        return _u2i(res)
+        micros, res = await self._pigpio_aio_command_pipeline([
+            (_PI_CMD_WVSM, 0, 0, 0, []),
+            (_PI_CMD_WVCAP, percent, 0, 0, [])])
+        return self._wave_created(res, micros)
+
+    def _wave_created(self, res, micros):
+        """Records the length of a newly created wave."""
+        wave_id = _u2i(res)
+        self._wave_micros[wave_id] = u2i(micros)
+        return wave_id
 
     async def wave_delete(self, wave_id):
         """
@@ -1643,6 +2819,8 @@ class Pi(object):
         ...
         """
         res = await self._pigpio_aio_command(_PI_CMD_WVDEL, wave_id, 0)
+        self._wave_micros.pop(wave_id, None)
+        self._wave_ends.pop(wave_id, None)
         return _u2i(res)
 
     async def wave_tx_start(self): # DEPRECATED
@@ -1680,6 +2858,7 @@ class Pi(object):
         ...
         """
         res = await self._pigpio_aio_command(_PI_CMD_WVTX, wave_id, 0)
+        self._wave_sent(wave_id, WAVE_MODE_ONE_SHOT)
         return _u2i(res)
 
     async def wave_send_repeat(self, wave_id):
@@ -1700,6 +2879,7 @@ class Pi(object):
         ...
         """
         res = await self._pigpio_aio_command(_PI_CMD_WVTXR, wave_id, 0)
+        self._wave_sent(wave_id, WAVE_MODE_REPEAT)
         return _u2i(res)
 
     async def wave_send_using_mode(self, wave_id, mode):
@@ -1735,8 +2915,23 @@ class Pi(object):
         ...
         """
         res = await self._pigpio_aio_command(_PI_CMD_WVTXM, wave_id, mode)
+        self._wave_sent(wave_id, mode)
         return _u2i(res)
 
+    def _wave_sent(self, wave_id, mode):
+        """Records the expected end of a wave transmission."""
+        now = self._loop.time()
+        micros = self._wave_micros.get(wave_id)
+        if micros is None or mode in (WAVE_MODE_REPEAT, WAVE_MODE_REPEAT_SYNC):
+            self._wave_ends.pop(wave_id, None)
+            self._wave_tx_end = None
+            return
+        start = now
+        if mode == WAVE_MODE_ONE_SHOT_SYNC and self._wave_tx_end is not None:
+            start = max(now, self._wave_tx_end)
+        self._wave_tx_end = start + micros / 1000000
+        self._wave_ends[wave_id] = self._wave_tx_end
+
     async def wave_tx_at(self):
         """
         Returns the id of the waveform currently being
@@ -1772,6 +2967,76 @@ class Pi(object):
         res = await self._pigpio_aio_command(_PI_CMD_WVBSY, 0, 0)
         return _u2i(res)
 
+    async def wave_wait(self, wave_id, poll=0.001, max_poll=0.05, early=0.002):
+        """
+        Waits until the waveform with id wave_id is no longer being
+        transmitted.
+
+         wave_id:= >=0 (as returned by a prior call to [*wave_create*]).
+            poll:= initial interval in seconds between polls.
+        max_poll:= maximum interval in seconds between polls.
+           early:= how long in seconds before the expected end of the
+                   waveform polling starts.
+
+        When the waveform was created with [*wave_create*] or
+        [*wave_create_and_pad*] and sent with [*wave_send_once*] or
+        [*wave_send_using_mode*], its length is known: this sleeps
+        until just before its expected end and then polls
+        [*wave_tx_at*] every poll seconds.  Otherwise, or if the
+        estimate was too short, the interval doubles up to max_poll.
+
+        A waveform sent in repeat mode never completes unless it is
+        stopped or replaced.
+
+        ...
+        await pi.wave_send_once(wid)
+        await pi.wave_wait(wid)
+        await pi.wave_delete(wid)
+        ...
+        """
+        async def busy():
+            return (await self.wave_tx_at()) == wave_id
+        await self._wave_poll(busy, self._wave_ends.get(wave_id),
+                              poll, max_poll, early)
+        self._wave_ends.pop(wave_id, None)
+
+    async def chain_wait(self, poll=0.001, max_poll=0.05, early=0.002):
+        """
+        Waits until the wave chain started with [*wave_chain*] has been
+        transmitted.
+
+            poll:= initial interval in seconds between polls.
+        max_poll:= maximum interval in seconds between polls.
+           early:= how long in seconds before the expected end of the
+                   chain polling starts.
+
+        The length of the chain is computed from the recorded lengths
+        of its waves, loops and delays.  This sleeps until just before
+        its expected end and then polls [*wave_tx_busy*], see
+        [*wave_wait*].  For a chain using Loop Forever or waves of
+        unknown length, polling starts immediately.
+
+        ...
+        await pi.wave_chain([wid[0], 255, 0, wid[1], 255, 1, 10, 0])
+        await pi.chain_wait()
+        ...
+        """
+        await self._wave_poll(self.wave_tx_busy, self._chain_end,
+                              poll, max_poll, early)
+        self._chain_end = None
+
+    async def _wave_poll(self, busy, end, poll, max_poll, early):
+        """Sleeps until just before end then polls busy adaptively."""
+        if end is not None:
+            delay = end - self._loop.time() - early
+            if delay > 0:
+                await asyncio.sleep(delay)
+        interval = poll
+        while await busy():
+            await asyncio.sleep(interval)
+            if end is None or self._loop.time() > end + early:
+                interval = min(interval * 2, max_poll)
+
     async def wave_tx_stop(self):
         """
         Stops the transmission of the current waveform.
@@ -1788,6 +3053,9 @@ class Pi(object):
         ...
         """
         res = await self._pigpio_aio_command(_PI_CMD_WVHLT, 0, 0)
+        self._wave_ends.clear()
+        self._wave_tx_end = None
+        self._chain_end = None
         return _u2i(res)
 
     async def wave_chain(self, data):
@@ -1885,6 +3153,12 @@ class Pi(object):
 
         res = await self._pigpio_aio_command_ext(
            _PI_CMD_WVCHA, 0, 0, len(data), [data])
+        micros = _chain_micros(data, self._wave_micros)
+        if micros is None:
+           self._chain_end = None
+        else:
+           self._chain_end = self._loop.time() + micros / 1000000
+        self._wave_tx_end = None
         return _u2i(res)
 
     async def wave_get_micros(self):
@@ -1955,6 +3229,74 @@ class Pi(object):
         res = await self._pigpio_aio_command(_PI_CMD_WVSC, 2, 0)
         return _u2i(res)
 
+    async def wave_stream(self, blocks, underrun_cb=None, poll=0.001):
+        """
+        Transmits a gapless waveform built from a stream of pulse blocks.
+
+             blocks:= an async iterable yielding lists of pulses.
+        underrun_cb:= optional function called with the index of the
+                      block which was queued too late.
+               poll:= interval in seconds between [*wave_tx_at*] polls
+                      when waiting for a wave boundary.
+
+        Returns a [*WaveStreamStats*] once all blocks have been sent.
+
+        Each block is turned into a waveform created with
+        [*wave_create_and_pad*] at 50%, so that one wave is transmitted
+        while the next one is built.  The next wave is queued with
+        WAVE_MODE_ONE_SHOT_SYNC and the switch happens at the wave
+        boundary.  A wave is only deleted once the transmission has
+        moved past it, its resources are then reused for the next block.
+
+        If the producer is too slow, the previous wave has finished
+        before the next one is queued: this is an underrun, there is a
+        gap in the output and the stream restarts with the late block.
+
+        Existing waveforms should be cleared with [*wave_clear*] before
+        streaming.
+
+        ...
+        async def blocks():
+            for i in range(1000):
+                yield [apigpio.Pulse(1<<4, 0, 100),
+                       apigpio.Pulse(0, 1<<4, 100)]
+
+        stats = await pi.wave_stream(blocks())
+        print(stats.underruns)
+        ...
+        """
+        stats = WaveStreamStats()
+        # waves handed to pigpiod, oldest first
+        queued = []
+        async for pulses in blocks:
+            if not len(pulses):
+                continue
+            if len(queued) == 2:
+                # Only two padded waves fit: release the oldest one.
+                await self._wave_stream_release(queued, poll)
+
+            await self.wave_add_generic(pulses)
+            wave_id = await self.wave_create_and_pad(50)
+
+            if queued and await self.wave_tx_at() != queued[-1]:
+                stats.underruns += 1
+                if underrun_cb is not None:
+                    underrun_cb(stats.blocks)
+            await self.wave_send_using_mode(wave_id, WAVE_MODE_ONE_SHOT_SYNC)
+            queued.append(wave_id)
+            stats.blocks += 1
+            stats.micros += self._wave_micros[wave_id]
+
+        while queued:
+            await self._wave_stream_release(queued, poll)
+        return stats
+
+    async def _wave_stream_release(self, queued, poll):
+        """Waits for the oldest streamed wave to be done and deletes it."""
+        wave_id = queued.pop(0)
+        await self.wave_wait(wave_id, poll, poll)
+        await self.wave_delete(wave_id)
+
     async def i2c_open(self, bus, address):
         """Open an i2c device on a bus."""
         res = await self._pigpio_aio_command(_PI_CMD_I2CO, int(bus), int(address))
@@ -1962,7 +3304,7 @@ class Pi(object):
     
     async def i2c_close(self, handle):
         """Close an i2c handle."""
-        res = await self._pigpio_aio_command(_PI_CMD_I2CC, handle)
+        res = await self._pigpio_aio_command(_PI_CMD_I2CC, handle, 0)
         return _u2i(res)
    
     async def i2c_write_byte_data(self, handle, register, data):
@@ -1971,33 +3313,515 @@ class Pi(object):
         res = await self._pigpio_aio_command_ext(_PI_CMD_I2CWB, handle, int(register), 4, extents)
         return _u2i(res)
    
-    async def _rxbuf(self, count):
-        """"Returns count bytes from the command socket."""
-        ext = await self._loop.sock_recv(self.s, count)
-        while len(ext) < count:
-            ext.extend((await self._loop.sock_recv(self.s, count - len(ext))))
-        return ext
+    async def _rxbuf(self, count, out=None):
+        """
+        Receives count bytes from the command socket into out, or into
+        a new bytearray if out is None, and returns a memoryview of them.
+        """
+        if out is None:
+            out = bytearray(count)
+        view = memoryview(out).cast('B')
+        if len(view) < count:
+            # Keep the socket in sync before reporting the error.
+            await self._rxbuf_into(view)
+            await self._rxbuf_into(bytearray(count - len(view)))
+            raise ValueError('reply of {} bytes does not fit in out'
+                             ' ({} bytes)'.format(count, len(view)))
+        view = view[:count]
+        await self._rxbuf_into(view)
+        return view
     
     async def i2c_read_byte_data(self, handle, register):
         """Write byte to i2c register on handle."""
         res = await self._pigpio_aio_command(_PI_CMD_I2CRB, handle, int(register))
         return _u2i(res)
    
-    async def i2c_read_i2c_block_data(self, handle, register, count):
-        """Read count bytes from an i2c handle."""
+    async def i2c_read_i2c_block_data(self, handle, register, count, out=None):
+        """
+        Read count bytes from an i2c handle.
+
+        The bytes are received into out, a writable bytes-like object of
+        at least count bytes, or into a new bytearray if out is None.
+        Returns a memoryview of the bytes read.
+        """
+        if out is not None and len(memoryview(out).cast('B')) < count:
+            raise ValueError('out is shorter than count')
         extents = [struct.pack("I", count)]
         async with self._lock:
-            bytes = await self._pigpio_aio_command_ext_unlocked(_PI_CMD_I2CRI, handle, int(register), 4, extents)
+            bytes = u2i(await self._pigpio_aio_command_ext_unlocked(_PI_CMD_I2CRI, handle, int(register), 4, extents))
             if bytes > 0:
-                data = await self._rxbuf(count)
+                data = await self._rxbuf(bytes, out)
             else:
                 data = ""
         return data
 
+    async def i2c_zip(self, handle, data, out=None):
+        """
+        Executes a sequence of I2C operations in a single command.
+
+        handle:= >=0 (as returned by a prior call to [*i2c_open*]).
+          data:= an [*I2CZip*] or the bytes of the concatenated
+                 commands.
+           out:= an optional writable buffer receiving the bytes read,
+                 by default a new bytearray is allocated.
+
+        The following commands are supported:
+
+        Name    @ Cmd & Data @ Meaning
+        End     @ 0          @ No more commands
+        Escape  @ 1          @ Next P is two bytes
+        On      @ 2          @ Switch combined flag on
+        Off     @ 3          @ Switch combined flag off
+        Address @ 4 P        @ Set I2C address to P
+        Flags   @ 5 lsb msb  @ Set I2C flags to lsb + (msb << 8)
+        Read    @ 6 P        @ Read P bytes of data
+        Write   @ 7 P ...    @ Write P bytes of data
+
+        Returns a tuple of the number of bytes read and a memoryview of
+        the bytes read by all the read steps, see [*I2CZip.split*].
+
+        ...
+        zip = apigpio.I2CZip().combined().write([0x32]).read(6)
+        count, data = await pi.i2c_zip(h, zip)
+        ...
+        """
+        # I p1 handle
+        # I p2 0
+        # I p3 len
+        ## extension ##
+        # s len data bytes
+        data = bytes(data)
+        async with self._lock:
+            count = u2i(await self._pigpio_aio_command_ext_unlocked(
+                _PI_CMD_I2CZ, handle, 0, len(data), [data]))
+            if count > 0:
+                rx = await self._rxbuf(count, out)
+            else:
+                rx = b''
+        return _u2i(count), rx
+
+    async def _rxbuf_into(self, buf):
+        """Receives len(buf) bytes from the command socket into buf."""
+        await _sock_recv_into(self._loop, self.s, buf)
+        if self._recorder is not None:
+            self._recorder.payload(buf)
+        if self._observer is not None and isinstance(self._lock,
+                                                     _CommandLock):
+            if self._lock.events:
+                self._lock.events[-1][2] += memoryview(buf).nbytes
+
+    async def spi_open(self, spi_channel, baud, spi_flags=0):
+        """
+        Returns a handle for the SPI device on the channel.  Data
+        will be transferred at baud bits per second.  The flags
+        may be used to modify the default behaviour of 4-wire
+        operation, mode 0, active low chip select.
+
+        spi_channel:= 0-1 (0-2 for the auxiliary SPI).
+               baud:= 32K-125M (values above 30M are unlikely to work).
+          spi_flags:= see below.
+
+        The flags are those of the pigpio spiOpen function, they
+        select the SPI mode, the chip select polarity, the auxiliary
+        SPI device and its word size and bit order.
+
+        ...
+        h = await pi.spi_open(1, 50000, 3)
+        ...
+        """
+        # I p1 spi_channel
+        # I p2 baud
+        # I p3 4
+        ## extension ##
+        # I spi_flags
+        extents = [struct.pack("I", spi_flags)]
+        res = await self._pigpio_aio_command_ext(
+            _PI_CMD_SPIO, spi_channel, baud, 4, extents)
+        return _u2i(res)
+
+    async def spi_close(self, handle):
+        """
+        Closes the SPI device associated with handle.
+
+        handle:= >=0 (as returned by a prior call to [*spi_open*]).
+
+        ...
+        await pi.spi_close(h)
+        ...
+        """
+        res = await self._pigpio_aio_command(_PI_CMD_SPIC, handle, 0)
+        return _u2i(res)
+
+    async def spi_read(self, handle, count):
+        """
+        Reads count bytes of data from the SPI device associated
+        with handle.
+
+        handle:= >=0 (as returned by a prior call to [*spi_open*]).
+         count:= >0, the number of bytes to read.
+
+        Returns a tuple of the number of bytes read and the bytes.
+
+        ...
+        (count, data) = await pi.spi_read(h, 60) # read 60 bytes
+        ...
+        """
+        async with self._lock:
+            count = u2i(await self._pigpio_aio_command_ext_unlocked(
+                _PI_CMD_SPIR, handle, count, 0, []))
+            if count > 0:
+                data = await self._rxbuf(count)
+            else:
+                data = b''
+        return _u2i(count), data
+
+    async def spi_read_into(self, handle, rx_buffer):
+        """
+        Reads len(rx_buffer) bytes of data from the SPI device
+        associated with handle, directly into rx_buffer.
+
+           handle:= >=0 (as returned by a prior call to [*spi_open*]).
+        rx_buffer:= a writable bytes-like object, e.g. a bytearray or
+                    a memoryview on a slice of a larger buffer.
+
+        No intermediate bytes object is created.
+
+        Returns the number of bytes read.
+
+        ...
+        buf = bytearray(60)
+        count = await pi.spi_read_into(h, buf)
+        ...
+        """
+        rx = memoryview(rx_buffer).cast('B')
+        async with self._lock:
+            count = u2i(await self._pigpio_aio_command_ext_unlocked(
+                _PI_CMD_SPIR, handle, len(rx), 0, []))
+            if count > 0:
+                await self._rxbuf_into(rx[:count])
+        return _u2i(count)
+
+    async def spi_write(self, handle, data):
+        """
+        Writes the data bytes to the SPI device associated with handle.
+
+        handle:= >=0 (as returned by a prior call to [*spi_open*]).
+          data:= the bytes to write.
+
+        Returns the number of bytes written.
+
+        ...
+        await pi.spi_write(h, b'\x02\xc0\x80') # write 3 bytes
+        ...
+        """
+        # I p1 handle
+        # I p2 0
+        # I p3 len
+        ## extension ##
+        # s len data bytes
+        res = await self._pigpio_aio_command_ext(
+            _PI_CMD_SPIW, handle, 0, len(data), [data])
+        return _u2i(res)
+
+    async def spi_xfer(self, handle, data):
+        """
+        Writes the data bytes to the SPI device associated with handle,
+        returning the data bytes read from the device.
+
+        handle:= >=0 (as returned by a prior call to [*spi_open*]).
+          data:= the bytes to write.
+
+        Returns a tuple of the number of bytes transferred and the
+        bytes read.
+
+        ...
+        (count, rx_data) = await pi.spi_xfer(h, b'\x01\x80\x00')
+        ...
+        """
+        async with self._lock:
+            count = u2i(await self._pigpio_aio_command_ext_unlocked(
+                _PI_CMD_SPIX, handle, 0, len(data), [data]))
+            if count > 0:
+                rx = await self._rxbuf(count)
+            else:
+                rx = b''
+        return _u2i(count), rx
+
+    async def spi_xfer_into(self, handle, tx, rx_buffer):
+        """
+        Writes the tx bytes to the SPI device associated with handle,
+        receiving the bytes read from the device directly into
+        rx_buffer.
+
+           handle:= >=0 (as returned by a prior call to [*spi_open*]).
+               tx:= the bytes to write.
+        rx_buffer:= a writable bytes-like object at least as long as
+                    tx, e.g. a preallocated bytearray.
+
+        No intermediate bytes object is created, which suits high rate
+        sampling loops reusing the same buffers.
+
+        Returns the number of bytes transferred.
+
+        ...
+        tx = b'\x01\x80\x00'
+        rx = bytearray(3)
+        while True:
+            await pi.spi_xfer_into(h, tx, rx)
+            value = ((rx[1] & 3) << 8) | rx[2]
+        ...
+        """
+        rx = memoryview(rx_buffer).cast('B')
+        if len(rx) < len(tx):
+            raise ValueError('rx_buffer is shorter than tx')
+        async with self._lock:
+            count = u2i(await self._pigpio_aio_command_ext_unlocked(
+                _PI_CMD_SPIX, handle, 0, len(tx), [tx]))
+            if count > 0:
+                await self._rxbuf_into(rx[:count])
+        return _u2i(count)
+
+    async def serial_open(self, tty, baud, ser_flags=0):
+        """
+        Returns a handle for the serial tty device opened
+        at baud bits per second.
+
+              tty:= the serial device to open.
+             baud:= baud rate in bits per second, see below.
+        ser_flags:= 0, no flags are currently defined.
+
+        The baud rate must be one of 50, 75, 110, 134, 150,
+        200, 300, 600, 1200, 1800, 2400, 4800, 9600, 19200,
+        38400, 57600, 115200, or 230400.
+
+        ...
+        h1 = await pi.serial_open("/dev/ttyAMA0", 300)
+        h2 = await pi.serial_open("/dev/ttyUSB1", 19200, 0)
+        ...
+        """
+        # I p1 baud
+        # I p2 ser_flags
+        # I p3 len
+        ## extension ##
+        # s len data bytes
+        res = await self._pigpio_aio_command_ext(
+            _PI_CMD_SERO, baud, ser_flags, len(tty), [tty])
+        return _u2i(res)
+
+    async def serial_close(self, handle):
+        """
+        Closes the serial device associated with handle.
+
+        handle:= >=0 (as returned by a prior call to [*serial_open*]).
+
+        ...
+        await pi.serial_close(h1)
+        ...
+        """
+        res = await self._pigpio_aio_command(_PI_CMD_SERC, handle, 0)
+        return _u2i(res)
+
+    async def serial_read(self, handle, count=1000, out=None):
+        """
+        Reads up to count bytes from the device associated with handle.
+
+        handle:= >=0 (as returned by a prior call to [*serial_open*]).
+         count:= >0, the number of bytes to read (defaults to 1000).
+           out:= an optional writable buffer receiving the bytes, at
+                 most its length is read.  By default a new bytearray
+                 is allocated.
+
+        Returns a tuple of the number of bytes read and a memoryview of
+        the bytes.
+
+        ...
+        (count, data) = await pi.serial_read(h2, 100)
+        if count > 0:
+            # process read data
+        ...
+        """
+        if out is not None:
+            count = min(count, len(memoryview(out).cast('B')))
+        async with self._lock:
+            count = u2i(await self._pigpio_aio_command_ext_unlocked(
+                _PI_CMD_SERR, handle, count, 0, []))
+            if count > 0:
+                data = await self._rxbuf(count, out)
+            else:
+                data = b''
+        return _u2i(count), data
+
+    async def serial_write(self, handle, data):
+        """
+        Writes the data bytes to the device associated with handle.
+
+        handle:= >=0 (as returned by a prior call to [*serial_open*]).
+          data:= the bytes to write.
+
+        ...
+        await pi.serial_write(h1, b'\x02\x03\x04')
+        await pi.serial_write(h2, b'help')
+        ...
+        """
+        # I p1 handle
+        # I p2 0
+        # I p3 len
+        ## extension ##
+        # s len data bytes
+        res = await self._pigpio_aio_command_ext(
+            _PI_CMD_SERW, handle, 0, len(data), [data])
+        return _u2i(res)
+
+    async def serial_data_available(self, handle):
+        """
+        Returns the number of bytes available to be read from the
+        device associated with handle.
+
+        handle:= >=0 (as returned by a prior call to [*serial_open*]).
+
+        ...
+        rdy = await pi.serial_data_available(h1)
+        if rdy > 0:
+            (b, d) = await pi.serial_read(h1, rdy)
+        ...
+        """
+        res = await self._pigpio_aio_command(_PI_CMD_SERDA, handle, 0)
+        return _u2i(res)
+
+    async def bb_serial_read_open(self, user_gpio, baud, bb_bits=8):
+        """
+        Opens a GPIO for bit bang reading of serial data.
+
+        user_gpio:= 0-31, the GPIO to use.
+             baud:= 50-250000
+          bb_bits:= 1-32
+
+        The serial data is held in a cyclic buffer and is read using
+        [*bb_serial_read*].
+
+        It is the caller's responsibility to read data from the cyclic
+        buffer in a timely fashion, see [*BitBangSerialStream*].
+
+        ...
+        status = await pi.bb_serial_read_open(4, 19200)
+        status = await pi.bb_serial_read_open(17, 9600)
+        ...
+        """
+        # I p1 user_gpio
+        # I p2 baud
+        # I p3 4
+        ## extension ##
+        # I bb_bits
+        extents = [struct.pack("I", bb_bits)]
+        res = await self._pigpio_aio_command_ext(
+            _PI_CMD_SLRO, user_gpio, baud, 4, extents)
+        return _u2i(res)
+
+    async def bb_serial_read(self, user_gpio):
+        """
+        Returns data from the bit bang serial cyclic buffer.
+
+        user_gpio:= 0-31 (opened in a prior call to [*bb_serial_read_open*])
+
+        The returned value is a tuple of the number of bytes read and
+        the bytes.
+
+        The bytes returned for each character depend upon the number of
+        data bits [*bb_bits*] specified in the [*bb_serial_read_open*]
+        command: one byte for 1-8 bits, two bytes for 9-16 bits and
+        four bytes for 17-32 bits.
+
+        ...
+        (count, data) = await pi.bb_serial_read(4)
+        ...
+        """
+        async with self._lock:
+            count = u2i(await self._pigpio_aio_command_ext_unlocked(
+                _PI_CMD_SLR, user_gpio, 8192, 0, []))
+            if count > 0:
+                data = await self._rxbuf(count)
+            else:
+                data = b''
+        return _u2i(count), data
+
+    async def bb_serial_read_into(self, user_gpio, buffer):
+        """
+        Reads data from the bit bang serial cyclic buffer directly into
+        buffer.
+
+        user_gpio:= 0-31 (opened in a prior call to [*bb_serial_read_open*])
+           buffer:= a writable bytes-like object, at most len(buffer)
+                    bytes are read.
+
+        Returns the number of bytes read.
+
+        ...
+        buf = bytearray(8192)
+        count = await pi.bb_serial_read_into(4, buf)
+        ...
+        """
+        view = memoryview(buffer).cast('B')
+        async with self._lock:
+            count = u2i(await self._pigpio_aio_command_ext_unlocked(
+                _PI_CMD_SLR, user_gpio, len(view), 0, []))
+            if count > 0:
+                await self._rxbuf_into(view[:count])
+        return _u2i(count)
+
+    async def bb_serial_read_close(self, user_gpio):
+        """
+        Closes a GPIO for bit bang reading of serial data.
+
+        user_gpio:= 0-31 (opened in a prior call to [*bb_serial_read_open*])
+
+        ...
+        status = await pi.bb_serial_read_close(17)
+        ...
+        """
+        res = await self._pigpio_aio_command(_PI_CMD_SLRC, user_gpio, 0)
+        return _u2i(res)
+
+    async def bb_serial_invert(self, user_gpio, invert):
+        """
+        Invert serial logic.
+
+        user_gpio:= 0-31 (opened in a prior call to [*bb_serial_read_open*])
+           invert:= 0-1 (1 invert, 0 normal)
+
+        ...
+        status = await pi.bb_serial_invert(17, 1)
+        ...
+        """
+        res = await self._pigpio_aio_command(_PI_CMD_SLRI, user_gpio, invert)
+        return _u2i(res)
+
     def __init__(self, loop=None):
         if loop is None:
             loop = asyncio.get_event_loop()
         self._loop = loop
         self.s = None
         self._notify = _callback_handler(self)
-        self._lock = asyncio.Lock()
+        self._raw_lock = asyncio.Lock()
+        self._lock = self._raw_lock
+        self._observer = None
+        self._recorder = None
+        self._response = bytearray(16)
+        self._script_params = bytearray(44)
+        self._wave_micros = {}
+        self._wave_ends = {}
+        self._wave_tx_end = None
+        self._chain_end = None
+        self._coalesce_window = None
+        self._pending_writes = None
+        self.shadow = None
+        self._shadow_task = None
+        self._address = None
+        self._connected = None
+        self._restore = None
+        self._reconnect_queue = True
+        self._reconnect_delays = None
+        self._reconnect_timeout = None
+        self._resync_cb = None
+        self._reconnect_task = None
+        self._stopping = False
+        self.reconnects = 0
@@ -0,0 +1,185 @@
+"""
+Conversion of pigpio ticks to the host clock.
+
+Ticks, e.g. those given to the callbacks, are microseconds since the
+Pi booted.  A TickClock samples the tick of pigpiod and estimates the
+offset and the drift between the ticks and time.monotonic_ns() of the
+host, the way NTP filters its samples:
+
+. .
+- each TICK command is bracketed by two host clock reads, the tick is
+  taken at the middle of the round trip, within half its duration;
+- the samples with the shortest round trips, least delayed by the
+  network and the scheduling, are the most accurate: the offset is
+  taken from the fastest recent sample and the drift is fitted on the
+  faster half of the history.
+. .
+
+...
+from apigpio.clock import TickClock
+
+clock = TickClock(pi)
+await clock.start()
+
+def edge(gpio, level, tick, host_ns):
+    print(gpio, level, host_ns)
+
+await pi.add_callback(4, apigpio.EITHER_EDGE, clock.timestamped(edge))
+await run_application(pi)
+await clock.stop()
+...
+"""
+import asyncio
+import collections
+import time
+
+from .apigpio import ApigpioError
+
+# Ticks are unsigned 32 bit microseconds.
+_WRAP = 1 << 32
+
+# A sample this far, in nanoseconds, from the estimate means the tick
+# counter restarted, i.e. the Pi rebooted.
+_RESTART_NS = 10000000
+
+Sample = collections.namedtuple('Sample', 'host_ns tick rtt_ns')
+
+
+def _tick_delta(tick, reference):
+    """Returns the signed microseconds from the reference tick to tick."""
+    return (tick - reference + (_WRAP >> 1)) % _WRAP - (_WRAP >> 1)
+
+
+class TickClock(object):
+    """
+    Estimates the host time of pigpio ticks.
+
+    . .
+     samples: the recent [*Sample*]s, tick unwrapped to 64 bits.
+    drift_ppm: the estimated drift of the tick, in parts per million,
+               positive when the tick runs slow.
+    error_ns: half the round trip time of the sample the offset is
+              taken from, a bound on the offset error.
+    restarts: number of times the tick counter restarted.
+    . .
+    """
+
+    def __init__(self, pi, window=8, history=64):
+        """
+        Initialises a clock.
+
+             pi:= the Pi whose ticks are converted.
+         window:= the offset is taken from the fastest of the last
+                  window samples.
+        history:= number of samples the drift is fitted on.
+        """
+        self.pi = pi
+        self.window = window
+        self.samples = collections.deque(maxlen=history)
+        self.drift_ppm = 0.0
+        self.error_ns = None
+        self.restarts = 0
+        self._reference = None
+        self._last_tick = None
+        self._task = None
+
+    async def sample(self):
+        """
+        Samples the tick of pigpiod once and updates the estimate.
+
+        Returns the [*Sample*].
+        """
+        t0 = time.monotonic_ns()
+        tick = await self.pi.get_current_tick()
+        t1 = time.monotonic_ns()
+        host_ns = (t0 + t1) // 2
+        if self._last_tick is None:
+            unwrapped = tick
+        else:
+            unwrapped = self.samples[-1].tick + \
+                _tick_delta(tick, self._last_tick)
+            expected = self.to_host_ns(tick)
+            if abs(host_ns - expected) > _RESTART_NS + t1 - t0:
+                self.samples.clear()
+                self.drift_ppm = 0.0
+                self.restarts += 1
+                unwrapped = tick
+        self._last_tick = tick
+        sample = Sample(host_ns, unwrapped, t1 - t0)
+        self.samples.append(sample)
+        self._update()
+        return sample
+
+    def _update(self):
+        recent = list(self.samples)[-self.window:]
+        reference = min(recent, key=lambda s: s.rtt_ns)
+        self._reference = (reference.host_ns, reference.tick & (_WRAP - 1))
+        self.error_ns = reference.rtt_ns // 2
+
+        # Least squares fit of the host time on the tick over the
+        # faster half of the samples.
+        rtts = sorted(s.rtt_ns for s in self.samples)
+        limit = rtts[(len(rtts) - 1) // 2]
+        fast = [s for s in self.samples if s.rtt_ns <= limit]
+        if len(fast) < 2 or fast[-1].tick - fast[0].tick < 1000000:
+            return
+        n = len(fast)
+        mean_tick = sum(s.tick for s in fast) / n
+        mean_host = sum(s.host_ns for s in fast) / n
+        var = sum((s.tick - mean_tick) ** 2 for s in fast)
+        if var:
+            cov = sum((s.tick - mean_tick) * (s.host_ns - mean_host)
+                      for s in fast)
+            self.drift_ppm = (cov / var / 1000.0 - 1.0) * 1e6
+
+    def to_host_ns(self, tick):
+        """
+        Returns the time.monotonic_ns() time of a tick, or None before
+        the first sample.
+
+        tick:= a pigpio tick within 35 minutes of the last sample.
+        """
+        if self._reference is None:
+            return None
+        host_ns, reference = self._reference
+        delta = _tick_delta(tick, reference)
+        return host_ns + int(delta * 1000 * (1.0 + self.drift_ppm / 1e6))
+
+    def timestamped(self, func):
+        """
+        Returns a callback calling func with the host time of the tick.
+
+        func:= a function taking four arguments (gpio, level, tick,
+               host_ns), host_ns as returned by [*to_host_ns*].
+        """
+        def _f(gpio, level, tick):
+            func(gpio, level, tick, self.to_host_ns(tick))
+        return _f
+
+    async def start(self, interval=1.0, burst=8):
+        """
+        Takes burst samples at once, then one every interval seconds
+        in the background until [*stop*].
+        """
+        for _ in range(burst):
+            await self.sample()
+        self._task = asyncio.ensure_future(self._run(interval))
+
+    async def _run(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.sample()
+            except (ApigpioError, OSError):
+                # The connection is down, see Pi.set_reconnect.
+                pass
+
+    async def stop(self):
+        """Stops the background sampling."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,252 @@
+"""
+Concurrent management of many pigpiod hosts.
+"""
+import asyncio
+import collections
+import time
+
+from .apigpio import Pi
+from .ctes import EITHER_EDGE
+from .metrics import LatencyHistogram
+
+# A notification of a host of a PiCluster, host being its name.
+ClusterEvent = collections.namedtuple('ClusterEvent', 'host gpio level tick')
+
+
+class HostHealth(object):
+    """
+    The health of a host of a [*PiCluster*].
+
+    . .
+      address: the (address, port) of its pigpiod.
+    connected: True while its connection is up.
+     commands: number of commands run on it.
+       errors: number of commands which failed, timeouts included.
+     timeouts: number of commands which timed out.
+    last_error: the last exception raised by a command, or None.
+          rtt: [*LatencyHistogram*] of the command durations.
+    . .
+    """
+
+    def __init__(self, pi, address):
+        self._pi = pi
+        self.address = address
+        self.commands = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.last_error = None
+        self.rtt = LatencyHistogram()
+
+    @property
+    def connected(self):
+        pi = self._pi
+        return pi.s is not None and not pi._stopping and \
+            pi._connected.is_set()
+
+
+class PiCluster(object):
+    """
+    Drives several pigpiod hosts concurrently.
+
+    Each host has its own Pi, connection and command socket, so that
+    a command broadcast to the cluster runs on all the hosts at the
+    same time and a slow or unreachable host only delays its own
+    result, bounded by the timeout.
+
+    A host whose command times out while waiting for its reply is
+    reconnected, the late reply would otherwise be read as the reply
+    of its next command, see [*set_reconnect*].  While it reconnects
+    its commands fail at once.  A method timing out between two
+    commands, e.g. sleeping in [*wave_wait*], is only cancelled.
+
+    The notifications of all the hosts are merged in a single queue of
+    [*ClusterEvent*]s tagged with the host name.
+
+    ...
+    cluster = apigpio.PiCluster({'rack1': ('10.0.0.11', 8888),
+                                 'rack2': ('10.0.0.12', 8888)},
+                                timeout=0.5)
+    await cluster.connect()
+    await cluster.broadcast('set_mode', 17, apigpio.OUTPUT)
+    results = await cluster.broadcast('write', 17, 1)
+    await cluster.add_callback(4)
+    async for event in cluster.events():
+        print(event.host, event.gpio, event.level)
+    ...
+    """
+
+    def __init__(self, hosts, timeout=1.0, max_events=10000):
+        """
+        Initialises a cluster.
+
+             hosts:= a dict of host names to (address, port), or a
+                     list of (address, port) named 'address:port'.
+           timeout:= default seconds a host has to run a command.
+        max_events:= notification events queued before new ones are
+                     dropped, counted in dropped_events.
+        """
+        if not isinstance(hosts, dict):
+            hosts = {'{}:{}'.format(*address): address for address in hosts}
+        self.timeout = timeout
+        self.pis = {}
+        self.health = {}
+        for name, address in hosts.items():
+            pi = Pi()
+            pi.set_reconnect(queue=False)
+            self.pis[name] = pi
+            self.health[name] = HostHealth(pi, address)
+        self.queue = asyncio.Queue(max_events)
+        self.dropped_events = 0
+
+    @property
+    def connected(self):
+        """The names of the hosts whose connection is up."""
+        return [name for name, h in self.health.items() if h.connected]
+
+    async def connect(self, timeout=None):
+        """
+        Connects to the hosts not connected yet, concurrently.
+
+        Returns a dict of host names to None or the exception raised
+        by the connection.
+        """
+        names = [name for name, pi in self.pis.items() if pi.s is None]
+        results = await asyncio.gather(
+            *[self._connect(name, timeout) for name in names],
+            return_exceptions=True)
+        return dict(zip(names, results))
+
+    async def _connect(self, name, timeout):
+        pi, health = self.pis[name], self.health[name]
+        try:
+            await asyncio.wait_for(pi.connect(health.address),
+                                   timeout or self.timeout)
+        except BaseException as e:
+            if pi.s is not None:
+                pi.s.close()
+                pi.s = None
+            health.last_error = e
+            raise
+
+    async def broadcast(self, method, *args, timeout=None, hosts=None,
+                        **kwargs):
+        """
+        Runs a Pi method on the connected hosts concurrently.
+
+         method:= the name of a Pi method, e.g. 'write'.
+        timeout:= seconds each host has, the cluster timeout if None.
+          hosts:= the names of the hosts to run on, all the connected
+                  hosts if None.
+         args, kwargs:= the arguments of the method.
+
+        Returns a dict of host names to the result of the method or the
+        exception it raised, asyncio.TimeoutError for a timeout.
+
+        ...
+        results = await cluster.broadcast('read', 4)
+        high = [host for host, level in results.items() if level == 1]
+        ...
+        """
+        if hosts is None:
+            hosts = self.connected
+        results = await asyncio.gather(
+            *[self._run(name, method, args, kwargs, timeout or self.timeout)
+              for name in hosts], return_exceptions=True)
+        return dict(zip(hosts, results))
+
+    async def _run(self, name, method, args, kwargs, timeout):
+        pi, health = self.pis[name], self.health[name]
+        health.commands += 1
+        t = time.perf_counter()
+        try:
+            result = await self._wait_for(
+                pi, getattr(pi, method)(*args, **kwargs), timeout)
+        except asyncio.TimeoutError as e:
+            health.timeouts += 1
+            health.errors += 1
+            health.last_error = e
+            raise
+        except Exception as e:
+            health.errors += 1
+            health.last_error = e
+            raise
+        health.rtt.record(time.perf_counter() - t)
+        return result
+
+    @staticmethod
+    async def _wait_for(pi, coro, timeout):
+        """
+        Like asyncio.wait_for, reconnecting pi if the timeout fired
+        while a command of coro was waiting for its reply.
+        """
+        task = asyncio.ensure_future(coro)
+        try:
+            done, _ = await asyncio.wait({task}, timeout=timeout)
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        if done:
+            return task.result()
+        if pi._lock.owner is task:
+            # Lost before the lock is released, so that no queued
+            # command reads the late reply.
+            pi._connection_lost()
+        task.cancel()
+        try:
+            await task
+        except (asyncio.CancelledError, Exception):
+            pass
+        raise asyncio.TimeoutError()
+
+    async def add_callback(self, user_gpio, edge=EITHER_EDGE, hosts=None):
+        """
+        Queues the edges of a gpio of the hosts as [*ClusterEvent*]s.
+
+        user_gpio:= 0-31.
+             edge:= EITHER_EDGE (default), RISING_EDGE, or FALLING_EDGE.
+            hosts:= the names of the hosts, all the connected hosts if
+                    None.
+
+        Returns a dict of host names to the Callback or the exception
+        raised.
+        """
+        if hosts is None:
+            hosts = self.connected
+        results = await asyncio.gather(
+            *[asyncio.wait_for(self.pis[name].add_callback(
+                user_gpio, edge, self._queue(name)), self.timeout)
+              for name in hosts], return_exceptions=True)
+        return dict(zip(hosts, results))
+
+    def _queue(self, name):
+        def _f(gpio, level, tick):
+            try:
+                self.queue.put_nowait(ClusterEvent(name, gpio, level, tick))
+            except asyncio.QueueFull:
+                self.dropped_events += 1
+        return _f
+
+    async def events(self):
+        """Yields the [*ClusterEvent*]s of all the hosts as they come."""
+        while True:
+            yield await self.queue.get()
+
+    def report(self):
+        """Returns a text table of the health of the hosts."""
+        lines = ['{:<16} {:>9} {:>8} {:>6} {:>8} {:>9} {:>9}'.format(
+            'host', 'connected', 'commands', 'errors', 'timeouts',
+            'rtt p50', 'rtt p99')]
+        for name, h in self.health.items():
+            lines.append('{:<16} {:>9} {:>8} {:>6} {:>8} {:>7.0f}us'
+                         ' {:>7.0f}us'.format(
+                             name, 'yes' if name in self.connected else 'no',
+                             h.commands, h.errors, h.timeouts,
+                             h.rtt.percentile(50) * 1e6,
+                             h.rtt.percentile(99) * 1e6))
+        return '\n'.join(lines)
+
+    async def stop(self):
+        """Disconnects from all the hosts."""
+        await asyncio.gather(*[pi.stop() for pi in self.pis.values()
+                               if pi.s is not None and not pi._stopping],
+                             return_exceptions=True)
@@ -42,6 +42,31 @@ PI_SCRIPT_RUNNING = 2
 PI_SCRIPT_WAITING = 3
 PI_SCRIPT_FAILED = 4
 
+# wave modes
+
+WAVE_MODE_ONE_SHOT = 0
+WAVE_MODE_REPEAT = 1
+WAVE_MODE_ONE_SHOT_SYNC = 2
+WAVE_MODE_REPEAT_SYNC = 3
+
+# wave_tx_at special values
+
+WAVE_NOT_FOUND = 9998
+NO_TX_WAVE = 9999
+
+# i2c_zip commands
+
+I2C_END = 0
+I2C_ESC = 1
+I2C_START = 2
+I2C_COMBINED_ON = 2
+I2C_STOP = 3
+I2C_COMBINED_OFF = 3
+I2C_ADDR = 4
+I2C_FLAGS = 5
+I2C_READ = 6
+I2C_WRITE = 7
+
 # notification flags
 
 NTFY_FLAGS_EVENT = (1 << 7)
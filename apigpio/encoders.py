@@ -0,0 +1,206 @@
+"""
+Vectorized bit-stream protocol encoders.
+
+The encoders of this module turn a bytes-like or NumPy buffer into a
+pulse array in a single NumPy pass.  As with apigpio.wavegen, a pulse
+array is a (n, 3) uint32 array of on/off/delay triplets which can be
+given directly to Pi.wave_add_generic.
+
+Waveform timings have a resolution of one microsecond, the protocol
+timings below are therefore rounded to whole microseconds.
+
+NumPy is an optional dependency of apigpio which is only required by
+this module.
+
+...
+from apigpio import encoders
+
+pulses = encoders.dshot(18, [48, 48, 48])
+wid = await encoders.create_wave(pi, pulses)
+await pi.wave_send_once(wid)
+...
+"""
+import numpy as np
+
+from .wavegen import gpio_masks
+
+# (T0H, T0L, T1H, T1L) in microseconds, by DShot rate.  DShot150 is
+# 6.67 us per bit and DShot300 3.33 us per bit.
+DSHOT_TIMINGS = {
+    150: (2, 5, 5, 2),
+    300: (1, 2, 2, 1),
+}
+
+
+def unpack_bits(data, msb_first=True):
+    """
+    Returns the bits of a buffer as a uint8 array of 0 and 1.
+
+         data:= bytes-like or NumPy buffer.
+    msb_first:= True to send the most significant bit of each byte
+                first.
+    """
+    data = np.frombuffer(memoryview(data).cast('B'), dtype=np.uint8)
+    return np.unpackbits(data, bitorder='big' if msb_first else 'little')
+
+
+def max_bytes(max_pulses, pulses_per_bit=2, extra=0):
+    """
+    Returns the number of data bytes which can be encoded in a waveform.
+
+        max_pulses:= the pulse budget, e.g. from
+                     Pi.wave_get_max_pulses.
+    pulses_per_bit:= the pulses used by the encoder for each bit.
+             extra:= the pulses used by the encoder per waveform.
+    """
+    return max(0, (max_pulses - extra) // (8 * pulses_per_bit))
+
+
+def nrz(gpio, bits, t0h, t0l, t1h, t1l, reset=0):
+    """
+    Encodes bits as one-wire pulse widths.
+
+     gpio:= the gpio 0-31 to transmit on.
+     bits:= array of 0 and 1, see [*unpack_bits*].
+      t0h:= high time in microseconds of a 0 bit.
+      t0l:= low time in microseconds of a 0 bit.
+      t1h:= high time in microseconds of a 1 bit.
+      t1l:= low time in microseconds of a 1 bit.
+    reset:= extra low time in microseconds after the last bit.
+
+    Each bit uses two pulses.
+
+    Returns a (n, 3) uint32 pulse array.
+    """
+    mask = gpio_masks([gpio])[0]
+    bits = np.asarray(bits, dtype=bool).ravel()
+    pulses = np.zeros((2 * bits.size, 3), dtype=np.uint32)
+    pulses[0::2, 0] = mask
+    pulses[0::2, 2] = np.where(bits, t1h, t0h)
+    pulses[1::2, 1] = mask
+    pulses[1::2, 2] = np.where(bits, t1l, t0l)
+    if bits.size:
+        pulses[-1, 2] += reset
+    return pulses
+
+
+def dshot_frames(throttles, telemetry=False):
+    """
+    Returns the 16 bit DShot frames of throttle values.
+
+    throttles:= sequence of values 0-2047 (48-2047 for throttle, lower
+                values are commands).
+    telemetry:= True to set the telemetry request bit.
+
+    A frame is the 11 bit value, the telemetry bit and a 4 bit checksum.
+    """
+    values = np.asarray(throttles, dtype=np.uint16).ravel()
+    if np.any(values > 2047):
+        raise ValueError('throttle not 0-2047')
+    values = (values << 1) | np.uint16(bool(telemetry))
+    crc = (values ^ (values >> 4) ^ (values >> 8)) & 0xF
+    return (values << 4) | crc
+
+
+def dshot(gpio, throttles, rate=150, telemetry=False, pause=20):
+    """
+    Encodes DShot ESC frames.
+
+         gpio:= the gpio 0-31 to transmit on.
+    throttles:= sequence of values 0-2047, one frame each.
+         rate:= 150 or 300.
+    telemetry:= True to set the telemetry request bit.
+        pause:= low time in microseconds after each frame.
+
+    Each frame uses 32 pulses.
+
+    Returns a (n, 3) uint32 pulse array.
+
+    ...
+    pulses = encoders.dshot(18, [1046] * 100, rate=300)
+    ...
+    """
+    try:
+        t0h, t0l, t1h, t1l = DSHOT_TIMINGS[rate]
+    except KeyError:
+        raise ValueError('DShot rate not 150 or 300')
+    frames = dshot_frames(throttles, telemetry).astype('>u2')
+    pulses = nrz(gpio, unpack_bits(frames.tobytes()), t0h, t0l, t1h, t1l)
+    pulses[31::32, 2] += pause
+    return pulses
+
+
+def manchester(gpio, data, half_bit, ieee=True, msb_first=True):
+    """
+    Encodes data with Manchester coding.
+
+         gpio:= the gpio 0-31 to transmit on.
+         data:= bytes-like or NumPy buffer.
+     half_bit:= half the bit period in microseconds.
+         ieee:= True for the IEEE 802.3 convention (0 is high-low, 1 is
+                low-high), False for the G. E. Thomas convention.
+    msb_first:= True to send the most significant bit of each byte
+                first.
+
+    Each bit uses two pulses, the line is left at the level of the
+    second half of the last bit.
+
+    Returns a (n, 3) uint32 pulse array.
+
+    ...
+    pulses = encoders.manchester(22, b'\\x55\\xaa', 500)
+    ...
+    """
+    mask = gpio_masks([gpio])[0]
+    bits = unpack_bits(data, msb_first).astype(bool)
+    second = bits if ieee else ~bits
+    levels = np.empty(2 * bits.size, dtype=bool)
+    levels[0::2] = ~second
+    levels[1::2] = second
+    pulses = np.zeros((levels.size, 3), dtype=np.uint32)
+    pulses[:, 0] = np.where(levels, mask, 0)
+    pulses[:, 1] = np.where(levels, 0, mask)
+    pulses[:, 2] = half_bit
+    return pulses
+
+
+def ws2812_spi(data):
+    """
+    Encodes WS2812 LED data as an SPI bit stream.
+
+    data:= bytes-like or NumPy buffer of the LED colours, in the order
+           expected by the LEDs (GRB for the WS2812B).
+
+    The WS2812 bit timings (0.4/0.8 us) are below the one microsecond
+    resolution of waveforms, so the LEDs are instead driven from the
+    SPI MOSI line clocked at 2.4 MHz: each data bit becomes three SPI
+    bits, 100 for a 0 and 110 for a 1.
+
+    Returns the bytes to write on the SPI bus.
+    """
+    bits = unpack_bits(data)
+    spi = np.empty((bits.size, 3), dtype=np.uint8)
+    spi[:, 0] = 1
+    spi[:, 1] = bits
+    spi[:, 2] = 0
+    return np.packbits(spi.ravel()).tobytes()
+
+
+async def create_wave(pi, pulses):
+    """
+    Creates a waveform from a pulse array.
+
+        pi:= a connected Pi.
+    pulses:= (n, 3) uint32 pulse array.
+
+    The pulse array is checked against [*wave_get_max_pulses*] before
+    anything is sent.
+
+    Returns the wave id.
+    """
+    max_pulses = await pi.wave_get_max_pulses()
+    if len(pulses) > max_pulses:
+        raise ValueError('{} pulses exceed the maximum of {}'
+                         .format(len(pulses), max_pulses))
+    await pi.wave_add_generic(pulses)
+    return await pi.wave_create()
@@ -0,0 +1,139 @@
+"""
+I2C device wrapper with a write-through register cache.
+"""
+
+
+class Register(object):
+    """
+    Description of a byte register of an I2C device.
+    """
+
+    def __init__(self, address, cacheable=False):
+        """
+        Initialises a register.
+
+          address:= the register address, 0-255.
+        cacheable:= True if the register only changes when written, e.g.
+                    configuration or calibration registers.  Volatile
+                    registers are always read from the device.
+        """
+        self.address = address
+        self.cacheable = cacheable
+
+
+class I2CDevice(object):
+    """
+    An I2C device opened on pigpiod, described by a register map.
+
+    Cacheable registers are read from the device once, later reads are
+    served locally.  Writes go to the device through
+    [*i2c_write_byte_data*] and update the cached value.  Volatile
+    registers, and addresses missing from the register map, are always
+    read from the device.  A register may be given by its name or its
+    address, both share the cache.
+
+    The hits and misses counters count the reads of cacheable
+    registers, served locally or from the device.
+
+    ...
+    bmp = await I2CDevice.open(pi, 1, 0x77, {
+        'calib0': Register(0xAA, cacheable=True),
+        'ctrl': Register(0xF4, cacheable=True),
+        'msb': Register(0xF6),
+    })
+    await bmp.write('ctrl', 0x2E)
+    calib = await bmp.read('calib0')
+    temp = await bmp.read('msb')
+    print(bmp.hit_rate)
+    ...
+    """
+
+    def __init__(self, pi, handle, registers=None):
+        """
+        Wraps an I2C handle.
+
+               pi:= a connected Pi.
+           handle:= >=0 (as returned by a prior call to [*i2c_open*]).
+        registers:= dict of register names to [*Register*].
+        """
+        self._pi = pi
+        self.handle = handle
+        self.registers = dict(registers or {})
+        self._cache = {}
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    async def open(cls, pi, bus, address, registers=None):
+        """
+        Opens the device at address on bus and returns its wrapper, see
+        [*i2c_open*].
+        """
+        handle = await pi.i2c_open(bus, address)
+        return cls(pi, handle, registers)
+
+    def _register(self, reg):
+        if isinstance(reg, Register):
+            return reg
+        if reg in self.registers:
+            return self.registers[reg]
+        if isinstance(reg, int):
+            # An address of the map shares the cache of its register.
+            for register in self.registers.values():
+                if register.address == reg:
+                    return register
+            return Register(reg)
+        raise KeyError('unknown register {!r}'.format(reg))
+
+    async def read(self, reg):
+        """
+        Returns the value of a register.
+
+        reg:= a register name, a [*Register*] or a register address.
+        """
+        reg = self._register(reg)
+        if not reg.cacheable:
+            return await self._pi.i2c_read_byte_data(self.handle,
+                                                     reg.address)
+        if reg.address in self._cache:
+            self.hits += 1
+            return self._cache[reg.address]
+        self.misses += 1
+        value = await self._pi.i2c_read_byte_data(self.handle, reg.address)
+        self._cache[reg.address] = value
+        return value
+
+    async def write(self, reg, value):
+        """
+        Writes the value of a register, updating the cache.
+
+          reg:= a register name, a [*Register*] or a register address.
+        value:= 0-255.
+        """
+        reg = self._register(reg)
+        self._cache.pop(reg.address, None)
+        res = await self._pi.i2c_write_byte_data(self.handle, reg.address,
+                                                 value)
+        if reg.cacheable:
+            self._cache[reg.address] = value
+        return res
+
+    def invalidate(self, reg=None):
+        """
+        Drops the cached value of a register, or of all registers if
+        reg is None, e.g. after a device reset.
+        """
+        if reg is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(self._register(reg).address, None)
+
+    @property
+    def hit_rate(self):
+        """The ratio of cacheable register reads served locally."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    async def close(self):
+        """Closes the device handle."""
+        return await self._pi.i2c_close(self.handle)
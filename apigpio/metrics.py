@@ -0,0 +1,154 @@
+"""
+Aggregation of the command reports of Pi.set_observer.
+"""
+
+
+class LatencyHistogram(object):
+    """
+    A histogram of durations with a bounded relative error.
+
+    As in HdrHistogram, durations are counted in microseconds in
+    log-linear buckets: exact up to 64 us, then 32 buckets per power
+    of two, so that any recorded value is known within about 3% over
+    any range, with a memory proportional to the number of distinct
+    buckets used.
+
+    . .
+    count: number of values recorded.
+      min: smallest value recorded, in seconds.
+      max: largest value recorded, in seconds.
+    . .
+    """
+
+    SUB_BITS = 5
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    @classmethod
+    def _index(cls, micros):
+        if micros < 2 << cls.SUB_BITS:
+            return micros
+        shift = micros.bit_length() - cls.SUB_BITS - 1
+        return (shift << cls.SUB_BITS) + (micros >> shift)
+
+    @classmethod
+    def _bounds(cls, index):
+        """Returns the lowest and highest microseconds of a bucket."""
+        if index < 2 << cls.SUB_BITS:
+            return index, index
+        shift = (index >> cls.SUB_BITS) - 1
+        low = (index - (shift << cls.SUB_BITS)) << shift
+        return low, low + (1 << shift) - 1
+
+    def record(self, seconds):
+        """Records a duration in seconds."""
+        index = self._index(max(0, int(seconds * 1e6)))
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+    @property
+    def mean(self):
+        """The mean of the values recorded, in seconds."""
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, p):
+        """
+        Returns the value in seconds below which p percent of the
+        recorded values fall.
+        """
+        if not self.count:
+            return 0.0
+        rank = max(1, p / 100.0 * self.count)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                break
+        high = self._bounds(index)[1] / 1e6
+        return min(max(high, self.min), self.max)
+
+
+class CommandStat(object):
+    """
+    The statistics of one command, see [*CommandStats*].
+
+    . .
+       count: number of commands.
+      errors: number of commands which returned an error.
+    last_error: the last error code returned.
+         rtt: [*LatencyHistogram*] of the round trip times.
+    lock_wait: [*LatencyHistogram*] of the waits for the socket.
+    tx_bytes: total request bytes.
+    rx_bytes: total response bytes.
+    . .
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.errors = 0
+        self.last_error = 0
+        self.rtt = LatencyHistogram()
+        self.lock_wait = LatencyHistogram()
+        self.tx_bytes = 0
+        self.rx_bytes = 0
+
+
+class CommandStats(object):
+    """
+    An observer aggregating the command reports of a Pi by command.
+
+    ...
+    stats = apigpio.CommandStats()
+    pi.set_observer(stats)
+    ...
+    print(stats.report())
+    print(stats.commands['WRITE'].rtt.percentile(99))
+    ...
+    """
+
+    def __init__(self):
+        self.commands = {}
+
+    def __call__(self, event):
+        stat = self.commands.get(event.name)
+        if stat is None:
+            stat = self.commands[event.name] = CommandStat(event.name)
+        stat.count += 1
+        if event.error:
+            stat.errors += 1
+            stat.last_error = event.error
+        stat.rtt.record(event.rtt)
+        stat.lock_wait.record(event.lock_wait)
+        stat.tx_bytes += event.tx_bytes
+        stat.rx_bytes += event.rx_bytes
+
+    def clear(self):
+        """Forgets all the statistics."""
+        self.commands.clear()
+
+    def report(self):
+        """Returns a text table of the statistics, busiest first."""
+        lines = ['{:<8} {:>8} {:>6} {:>9} {:>9} {:>9} {:>9} {:>10} {:>10}'
+                 .format('command', 'count', 'errors', 'rtt p50', 'rtt p99',
+                         'rtt max', 'lock p99', 'tx bytes', 'rx bytes')]
+        for stat in sorted(self.commands.values(), key=lambda s: -s.count):
+            lines.append(
+                '{:<8} {:>8} {:>6} {:>7.0f}us {:>7.0f}us {:>7.0f}us'
+                ' {:>7.0f}us {:>10} {:>10}'.format(
+                    stat.name, stat.count, stat.errors,
+                    stat.rtt.percentile(50) * 1e6,
+                    stat.rtt.percentile(99) * 1e6, stat.rtt.max * 1e6,
+                    stat.lock_wait.percentile(99) * 1e6,
+                    stat.tx_bytes, stat.rx_bytes))
+        return '\n'.join(lines)
@@ -0,0 +1,255 @@
+"""
+Recording and replay of the pigpiod socket traffic of a Pi.
+
+A recording is a binary file made of a header followed by frames.
+Each frame is a kind byte, the time in microseconds since the start
+of the recording (uint64), the data length (uint32), all little
+endian, and the data:
+
+. .
+REQUEST: bytes sent on the command socket, one or more commands.
+RESPONSE: a 16 bytes command response.
+PAYLOAD: extension bytes following a response.
+NOTIFY: a 12 bytes notification record.
+. .
+
+A Replayer serves a recording to a Pi in place of pigpiod, so that an
+application can be run offline against recorded traffic.
+
+...
+from apigpio import recording
+
+# on site
+pi.set_recorder(recording.Recorder('site.rec'))
+
+# offline
+replayer = recording.Replayer('site.rec', speed=None)
+await pi.connect(await replayer.start())
+...
+"""
+import asyncio
+import struct
+import time
+
+from .apigpio import _PI_CMD_NOIB
+
+MAGIC = b'APGREC1\n'
+
+REQUEST = 0
+RESPONSE = 1
+PAYLOAD = 2
+NOTIFY = 3
+
+_FRAME = struct.Struct('<BQI')
+
+
+class Recorder(object):
+    """
+    Writes the traffic of a Pi to a recording file, see
+    [*set_recorder*].
+
+    ...
+    with recording.Recorder('site.rec') as rec:
+        pi.set_recorder(rec)
+        await run_application(pi)
+        pi.set_recorder(None)
+    ...
+    """
+
+    def __init__(self, path):
+        """
+        Creates the recording file.
+
+        path:= the file name.
+        """
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC)
+        self._start = time.perf_counter()
+        self.frames = 0
+
+    def _write(self, kind, data):
+        data = memoryview(data).cast('B')
+        micros = int((time.perf_counter() - self._start) * 1e6)
+        self._file.write(_FRAME.pack(kind, micros, len(data)))
+        self._file.write(data)
+        self.frames += 1
+
+    def request(self, data):
+        """Records bytes sent on the command socket."""
+        self._write(REQUEST, data)
+
+    def response(self, data):
+        """Records a 16 bytes command response."""
+        self._write(RESPONSE, data)
+
+    def payload(self, data):
+        """Records extension bytes following a response."""
+        self._write(PAYLOAD, data)
+
+    def notification(self, data):
+        """Records a 12 bytes notification record."""
+        self._write(NOTIFY, data)
+
+    def flush(self):
+        """Writes the buffered frames to the recording file."""
+        self._file.flush()
+
+    def close(self):
+        """Flushes and closes the recording file."""
+        if not self._file.closed:
+            self._file.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def read_recording(path):
+    """
+    Yields the frames of a recording file as (kind, seconds, data)
+    tuples.
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError('{} is not an apigpio recording'.format(path))
+        while True:
+            header = f.read(_FRAME.size)
+            if len(header) < _FRAME.size:
+                return
+            kind, micros, length = _FRAME.unpack(header)
+            data = f.read(length)
+            if len(data) < length:
+                return
+            yield kind, micros / 1e6, data
+
+
+class Replayer(object):
+    """
+    A stand-in for pigpiod serving a recording.
+
+    Each command received on the command socket is answered with the
+    next recorded response and its payload, whatever the command.
+    Notification records are sent on the notification socket in their
+    recorded order relative to the command responses, so that a
+    record is never delivered before the commands preceding it, e.g.
+    the one registering its callback, have been replayed.
+
+    With speed a number, responses are delayed by their recorded
+    round trip time and notifications by their recorded time, both
+    divided by speed.  With speed None everything is sent as fast as
+    possible.
+
+    . .
+      commands: number of commands answered.
+    mismatches: number of commands differing from the recorded
+                command answered.
+     exhausted: number of commands received after the end of the
+                recording, answered with a 0 result.
+    notifications: number of notification records sent.
+    . .
+    """
+
+    def __init__(self, path, speed=1.0):
+        """
+        Loads a recording.
+
+         path:= the recording file name.
+        speed:= the replay speed, 1.0 for real time, None for as fast
+                as possible.
+        """
+        self.speed = speed
+        self._responses = []
+        self._notifications = []
+        sent = 0.0
+        for kind, t, data in read_recording(path):
+            if kind == REQUEST:
+                sent = t
+            elif kind == RESPONSE:
+                self._responses.append((t - sent, bytearray(data)))
+            elif kind == PAYLOAD and self._responses:
+                self._responses[-1][1].extend(data)
+            elif kind == NOTIFY:
+                self._notifications.append(
+                    (t, len(self._responses), data))
+        self.commands = 0
+        self.mismatches = 0
+        self.exhausted = 0
+        self.notifications = 0
+        self._answered = asyncio.Condition()
+        self._start = None
+        self._server = None
+        self._tasks = []
+
+    async def start(self, host='127.0.0.1', port=0):
+        """
+        Starts serving and returns the (host, port) address to give to
+        [*connect*].
+        """
+        self._server = await asyncio.start_server(self._client, host, port)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def close(self):
+        """Stops serving."""
+        for task in self._tasks:
+            task.cancel()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _client(self, reader, writer):
+        loop = asyncio.get_event_loop()
+        if self._start is None:
+            self._start = loop.time()
+        notify = False
+        try:
+            while True:
+                header = await reader.readexactly(16)
+                cmd, p1, p2, p3 = struct.unpack('IIII', header)
+                if p3:
+                    await reader.readexactly(p3)
+                if cmd == _PI_CMD_NOIB or notify:
+                    # The notification socket, its other commands
+                    # (e.g. NC) are not recorded.
+                    writer.write(struct.pack('IIII', cmd, p1, p2, 0))
+                    if not notify:
+                        notify = True
+                        self._tasks.append(
+                            asyncio.ensure_future(self._notify(writer)))
+                    continue
+                await self._answer(writer, cmd, p1, p2)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        writer.close()
+
+    async def _answer(self, writer, cmd, p1, p2):
+        if self.commands >= len(self._responses):
+            self.exhausted += 1
+            writer.write(struct.pack('IIII', cmd, p1, p2, 0))
+        else:
+            rtt, data = self._responses[self.commands]
+            if struct.unpack_from('I', data)[0] != cmd:
+                self.mismatches += 1
+            if self.speed:
+                await asyncio.sleep(rtt / self.speed)
+            writer.write(data)
+        self.commands += 1
+        async with self._answered:
+            self._answered.notify_all()
+
+    async def _notify(self, writer):
+        loop = asyncio.get_event_loop()
+        for t, after, data in self._notifications:
+            async with self._answered:
+                await self._answered.wait_for(
+                    lambda: self.commands >= after)
+            if self.speed:
+                delay = self._start + t / self.speed - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            writer.write(data)
+            self.notifications += 1
+            await writer.drain()
@@ -0,0 +1,241 @@
+"""
+Periodic sampling of many registers and GPIO banks.
+"""
+import asyncio
+import collections
+import math
+
+from .apigpio import u2i, ApigpioError, _PI_CMD_BR1, _PI_CMD_BR2, _PI_CMD_READ, \
+    _PI_CMD_I2CRB, _PI_CMD_I2CRW
+
+
+class Operation(object):
+    """
+    A pigpio command sampled by a [*Sampler*].
+
+    Only commands whose reply is a single 32 bit value can be sampled,
+    the functions below build the usual ones.
+    """
+
+    def __init__(self, cmd, p1=0, p2=0, signed=True):
+        """
+        Initialises an operation.
+
+           cmd:= the pigpio command number.
+         p1,p2:= the command parameters.
+        signed:= True if negative results are pigpio errors, False
+                 for the bank reads whose result is a bit mask.
+        """
+        self.command = (cmd, p1, p2, 0, [])
+        self.signed = signed
+
+
+def read_bank_1():
+    """Samples the levels of gpios 0-31, see [*read_bank_1*]."""
+    return Operation(_PI_CMD_BR1, signed=False)
+
+
+def read_bank_2():
+    """Samples the levels of gpios 32-53, see [*read_bank_2*]."""
+    return Operation(_PI_CMD_BR2, signed=False)
+
+
+def read(gpio):
+    """Samples the level of a gpio, see [*read*]."""
+    return Operation(_PI_CMD_READ, gpio)
+
+
+def i2c_read_byte_data(handle, register):
+    """Samples a byte register of an I2C device."""
+    return Operation(_PI_CMD_I2CRB, handle, register)
+
+
+def i2c_read_word_data(handle, register):
+    """Samples a word register of an I2C device."""
+    return Operation(_PI_CMD_I2CRW, handle, register)
+
+
+class Channel(object):
+    """
+    A periodically sampled operation and its statistics.
+
+    The samples are kept in the history ring buffer as (time, value)
+    tuples, time being the event loop time at which the burst holding
+    the sample was sent.  Negative values are pigpio errors, which are
+    also counted in errors.
+
+    . .
+        samples: number of samples taken.
+         missed: number of periods skipped because the sampler was late.
+         errors: number of samples which returned a pigpio error.
+       failures: number of samples lost because their burst failed,
+                 e.g. the connection to pigpiod was down.
+         period: mean actual period in seconds.
+         jitter: standard deviation of the actual period in seconds.
+    max_latency: largest delay in seconds between the due time of a
+                 sample and the time it was sent.
+    . .
+    """
+
+    def __init__(self, name, operation, period, history):
+        self.name = name
+        self.operation = operation
+        self.nominal_period = period
+        self.history = collections.deque(maxlen=history)
+        self.samples = 0
+        self.missed = 0
+        self.errors = 0
+        self.failures = 0
+        self.max_latency = 0.0
+        self.due = None
+        self._last = None
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    @property
+    def period(self):
+        return self._mean
+
+    @property
+    def jitter(self):
+        n = self.samples - 1
+        return math.sqrt(self._m2 / n) if n > 0 else 0.0
+
+    def _record(self, t, res):
+        value = u2i(res) if self.operation.signed else res
+        if self.operation.signed and value < 0:
+            self.errors += 1
+        self.history.append((t, value))
+        self.samples += 1
+        self.max_latency = max(self.max_latency, t - self.due)
+        if self._last is not None:
+            # Welford's running mean and variance of the period.
+            period = t - self._last
+            n = self.samples - 1
+            delta = period - self._mean
+            self._mean += delta / n
+            self._m2 += delta * (period - self._mean)
+        self._last = t
+
+    def _advance(self, now):
+        self.due += self.nominal_period
+        if self.due <= now:
+            skipped = int((now - self.due) // self.nominal_period) + 1
+            self.missed += skipped
+            self.due += skipped * self.nominal_period
+
+
+class Sampler(object):
+    """
+    Samples operations on fixed periods, in pipelined bursts.
+
+    All due operations are sent together in a single write and their
+    results read back in order, so a burst costs a single round trip
+    and a single acquisition of the Pi lock.  Due times are aligned on
+    a common origin, so that operations with commensurate periods fall
+    on the same ticks, and operations due within tick seconds of each
+    other are sent in the same burst.
+
+    A burst failing on a socket or pigpio error does not stop the
+    sampling: the samples are counted in the failures of their
+    channels and the error is kept in last_error.
+
+    ...
+    from apigpio import sampler
+
+    s = sampler.Sampler(pi)
+    accel = s.add('accel_x', sampler.i2c_read_word_data(h, 0x28), 0.01)
+    s.add('buttons', sampler.read_bank_1(), 0.005)
+    s.start()
+    await asyncio.sleep(10)
+    await s.stop()
+    print(accel.period, accel.jitter, accel.missed)
+    ...
+    """
+
+    def __init__(self, pi, tick=0.001, history=1000):
+        """
+        Initialises a sampler.
+
+             pi:= a connected Pi.
+           tick:= operations due within tick seconds are coalesced.
+        history:= number of samples kept for each channel.
+        """
+        self._pi = pi
+        self.tick = tick
+        self.history = history
+        self.channels = {}
+        self.last_error = None
+        self._task = None
+        self._changed = asyncio.Event()
+
+    def add(self, name, operation, period):
+        """
+        Adds a channel sampling operation every period seconds and
+        returns it.
+        """
+        channel = Channel(name, operation, period, self.history)
+        self.channels[name] = channel
+        self._changed.set()
+        return channel
+
+    def remove(self, name):
+        """Removes a channel."""
+        del self.channels[name]
+
+    def start(self):
+        """Starts sampling in a background task."""
+        if self._task is None:
+            self._task = asyncio.ensure_future(self.run())
+
+    async def stop(self):
+        """Stops the background task."""
+        task, self._task = self._task, None
+        if task is None:
+            return
+        if task.done():
+            if not task.cancelled():
+                self.last_error = task.exception() or self.last_error
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def run(self):
+        """Samples the channels until cancelled."""
+        loop = self._pi._loop
+        origin = loop.time()
+        while True:
+            now = loop.time()
+            for c in self.channels.values():
+                if c.due is None:
+                    # First due time on the common grid of its period.
+                    c.due = origin + math.ceil(
+                        (now - origin) / c.nominal_period) * c.nominal_period
+            due = [c for c in self.channels.values()
+                   if c.due <= now + self.tick]
+            if due:
+                try:
+                    results = await self._pi._pigpio_aio_command_pipeline(
+                        [c.operation.command for c in due])
+                except (ApigpioError, OSError) as e:
+                    self.last_error = e
+                    for c in due:
+                        c.failures += 1
+                        c._advance(loop.time())
+                    continue
+                for c, res in zip(due, results):
+                    c._record(now, res)
+                    c._advance(loop.time())
+                continue
+            self._changed.clear()
+            if not self.channels:
+                await self._changed.wait()
+                continue
+            delay = min(c.due for c in self.channels.values()) - now
+            try:
+                await asyncio.wait_for(self._changed.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,488 @@
+"""
+Building and caching of the scripts run by pigpiod.
+"""
+import asyncio
+import collections
+import contextlib
+import hashlib
+
+from .apigpio import ApigpioError, error_text
+from .ctes import *
+
+
+async def _wait_initialised(pi, script_id):
+    """Waits until pigpiod has initialised a newly stored script."""
+    while (await pi.script_status(script_id))[0] == PI_SCRIPT_INITING:
+        await asyncio.sleep(0.001)
+
+
+async def _status(call):
+    """
+    Returns the result of a Pi call, the pigpio error number if it
+    failed, whether errors raise exceptions or not.
+    """
+    try:
+        return await call
+    except ApigpioError as e:
+        if e.code is None:
+            raise
+        return e.code
+
+
+# The script language names the modes by letter.
+_MODE_LETTERS = {INPUT: 'r', OUTPUT: 'w', ALT0: '0', ALT1: '1', ALT2: '2',
+                 ALT3: '3', ALT4: '4', ALT5: '5'}
+
+
+class Var(object):
+    """A script variable v0-v149, see [*ScriptBuilder.var*]."""
+
+    def __init__(self, n):
+        if not 0 <= n <= 149:
+            raise ValueError('variable not v0-v149')
+        self.n = n
+
+    def __str__(self):
+        return 'v{}'.format(self.n)
+
+
+class Param(object):
+    """A script parameter p0-p9, see [*ScriptBuilder.param*]."""
+
+    def __init__(self, n):
+        if not 0 <= n <= 9:
+            raise ValueError('parameter not p0-p9')
+        self.n = n
+
+    def __str__(self):
+        return 'p{}'.format(self.n)
+
+
+class Label(object):
+    """A jump target, see [*ScriptBuilder.label*]."""
+
+    def __init__(self, tag):
+        self.tag = tag
+        self.marked = False
+
+
+class ScriptBuilder(object):
+    """
+    Builds the text of a pigpiod script from Python calls.
+
+    Loops run by pigpiod itself are not limited by the network round
+    trip time.  The builder methods map onto the script commands,
+    operands being ints, [*Var*] or [*Param*]; the labels, loops and
+    waits are turned into numbered tags.  Operand ranges and tags are
+    checked locally, so that errors are raised before the script
+    reaches pigpiod.
+
+    The accumulator A and the flags F of the script language are
+    implicit: [*read*] and the arithmetic methods set both, [*cmp*]
+    sets F, and the conditional jumps test F.
+
+    ...
+    # when gpio 4 goes high, send p0 pulses of p1 us on gpio 17
+    b = apigpio.ScriptBuilder()
+    with b.forever():
+        b.wait_level(4, 1)
+        with b.repeat(b.param(0)):
+            b.pulse(17, b.param(1))
+            b.mics(b.param(1))
+        b.wait_level(4, 0)
+    script = await b.store(pi)
+    await script.run(10, 50)
+    ...
+    """
+
+    def __init__(self):
+        self._lines = []
+        self._labels = []
+        self._next_var = 0
+
+    # Operands.
+
+    def var(self):
+        """Allocates and returns a new variable."""
+        v = Var(self._next_var)
+        self._next_var += 1
+        return v
+
+    @staticmethod
+    def param(n):
+        """Returns the parameter n, 0-9, given to [*Script.run*]."""
+        return Param(n)
+
+    @staticmethod
+    def _operand(x):
+        if isinstance(x, (Var, Param)):
+            return str(x)
+        if isinstance(x, bool) or not isinstance(x, int):
+            raise TypeError('operand not an int, Var or Param: {!r}'
+                            .format(x))
+        if not -(1 << 31) <= x < (1 << 32):
+            raise ValueError('operand not 32 bit: {}'.format(x))
+        return str(x)
+
+    @staticmethod
+    def _gpio(gpio):
+        if isinstance(gpio, int) and not 0 <= gpio <= 53:
+            raise ValueError('gpio not 0-53')
+        return ScriptBuilder._operand(gpio)
+
+    def _emit(self, *words):
+        self._lines.append(' '.join(words))
+        return self
+
+    # Gpio commands.
+
+    def write(self, gpio, level):
+        """Sets a gpio level, 0 or 1."""
+        if isinstance(level, int) and level not in (0, 1):
+            raise ValueError('level not 0 or 1')
+        return self._emit('w', self._gpio(gpio), self._operand(level))
+
+    def read(self, gpio):
+        """Reads a gpio level into A and F."""
+        return self._emit('r', self._gpio(gpio))
+
+    def mode(self, gpio, mode):
+        """Sets a gpio mode, INPUT, OUTPUT or ALT0-ALT5."""
+        if mode not in _MODE_LETTERS:
+            raise ValueError('bad gpio mode {!r}'.format(mode))
+        return self._emit('m', self._gpio(gpio), _MODE_LETTERS[mode])
+
+    def pulse(self, gpio, micros, level=1):
+        """Sets gpio to level for micros microseconds."""
+        self.write(gpio, level)
+        self.mics(micros)
+        return self.write(gpio, 1 - level)
+
+    def mils(self, millis):
+        """Waits millis milliseconds."""
+        return self._emit('mils', self._operand(millis))
+
+    def mics(self, micros):
+        """Waits micros microseconds."""
+        return self._emit('mics', self._operand(micros))
+
+    # Variables and accumulator.
+
+    def ld(self, var, x):
+        """Sets var to x."""
+        return self._emit('ld', self._var(var), self._operand(x))
+
+    def lda(self, x):
+        """Sets A to x."""
+        return self._emit('lda', self._operand(x))
+
+    def sta(self, var):
+        """Sets var to A."""
+        return self._emit('sta', self._var(var))
+
+    def add(self, x):
+        """Adds x to A."""
+        return self._emit('add', self._operand(x))
+
+    def sub(self, x):
+        """Subtracts x from A."""
+        return self._emit('sub', self._operand(x))
+
+    def cmp(self, x):
+        """Sets F to A - x."""
+        return self._emit('cmp', self._operand(x))
+
+    def inr(self, var):
+        """Increments var and sets F to it."""
+        return self._emit('inr', self._var(var))
+
+    def dcr(self, var):
+        """Decrements var and sets F to it."""
+        return self._emit('dcr', self._var(var))
+
+    @staticmethod
+    def _var(var):
+        if not isinstance(var, (Var, Param)):
+            raise TypeError('not a Var or Param: {!r}'.format(var))
+        return str(var)
+
+    # Control flow.
+
+    def label(self):
+        """Returns a new label, placed with [*mark*]."""
+        label = Label(len(self._labels))
+        self._labels.append(label)
+        return label
+
+    def mark(self, label):
+        """Places label at the current position."""
+        if label.marked:
+            raise ValueError('label {} placed twice'.format(label.tag))
+        label.marked = True
+        return self._emit('tag', str(label.tag))
+
+    def jmp(self, label):
+        """Jumps to label."""
+        return self._emit('jmp', str(label.tag))
+
+    def jz(self, label):
+        """Jumps to label if F is zero."""
+        return self._emit('jz', str(label.tag))
+
+    def jnz(self, label):
+        """Jumps to label if F is not zero."""
+        return self._emit('jnz', str(label.tag))
+
+    def jp(self, label):
+        """Jumps to label if F is positive or zero."""
+        return self._emit('jp', str(label.tag))
+
+    def jm(self, label):
+        """Jumps to label if F is negative."""
+        return self._emit('jm', str(label.tag))
+
+    def call(self, label):
+        """Calls the subroutine at label."""
+        return self._emit('call', str(label.tag))
+
+    def ret(self):
+        """Returns from a subroutine."""
+        return self._emit('ret')
+
+    def halt(self):
+        """Halts the script."""
+        return self._emit('halt')
+
+    @contextlib.contextmanager
+    def repeat(self, count):
+        """
+        Repeats the commands of the with block count times, count
+        being an int, [*Var*] or [*Param*].
+        """
+        counter = self.var()
+        top, end = self.label(), self.label()
+        self.ld(counter, count)
+        self.mark(top)
+        self.dcr(counter)
+        self.jm(end)
+        yield counter
+        self.jmp(top)
+        self.mark(end)
+
+    @contextlib.contextmanager
+    def forever(self):
+        """Repeats the commands of the with block until stopped."""
+        top = self.label()
+        self.mark(top)
+        yield
+        self.jmp(top)
+
+    def wait_level(self, gpio, level, poll=10):
+        """
+        Waits until gpio is at level, polling every poll
+        microseconds.
+        """
+        top, done = self.label(), self.label()
+        self.mark(top)
+        self.read(gpio)
+        self.cmp(level)
+        self.jz(done)
+        self.mics(poll)
+        self.jmp(top)
+        return self.mark(done)
+
+    def build(self):
+        """Returns the script text."""
+        for label in self._labels:
+            if not label.marked:
+                raise ValueError('label {} never placed'.format(label.tag))
+        if not self._lines:
+            raise ValueError('empty script')
+        return ' '.join(self._lines)
+
+    async def store(self, pi):
+        """
+        Stores the script on pigpiod and returns its [*Script*]
+        handle.
+        """
+        script_id = await pi.store_script(self.build().encode('latin-1'))
+        await _wait_initialised(pi, script_id)
+        return Script(pi, script_id)
+
+
+class Script(object):
+    """
+    A script stored on pigpiod, as returned by [*ScriptBuilder.store*].
+    """
+
+    def __init__(self, pi, script_id):
+        self._pi = pi
+        self.script_id = script_id
+
+    async def run(self, *params):
+        """Runs the script with up to 10 parameters."""
+        return await self._pi.run_script(self.script_id,
+                                         list(params) if params else None)
+
+    async def status(self):
+        """Returns the run status and parameters, see [*script_status*]."""
+        return await self._pi.script_status(self.script_id)
+
+    async def stop(self):
+        """Stops the script."""
+        return await self._pi.stop_script(self.script_id)
+
+    async def wait(self, timeout=None):
+        """
+        Waits for the script to stop running, see [*wait_script*], and
+        returns its final status and parameters.
+        """
+        return await self._pi.wait_script(self.script_id, timeout)
+
+    async def delete(self):
+        """Deletes the script from pigpiod."""
+        return await self._pi.delete_script(self.script_id)
+
+
+class ScriptCache(object):
+    """
+    Stores scripts on pigpiod once and reuses their ids.
+
+    Scripts are identified by the SHA-1 hash of their text: storing or
+    running a script already stored through the cache costs no
+    [*store_script*] call.  When pigpiod has no room left for a new
+    script, or when max_scripts are stored, the least recently used
+    scripts which are not running are deleted.
+
+    Stored scripts outlive the connection, the ids of the cache stay
+    valid across reconnects.  The ids attribute can be saved and given
+    back as known after a restart of the application; an id which no
+    longer exists on pigpiod is stored again transparently, but an id
+    reused by another client for a different script cannot be
+    detected.
+
+    . .
+         hits: number of scripts found in the cache.
+       misses: number of scripts stored on pigpiod.
+    evictions: number of scripts deleted to make room.
+    . .
+
+    ...
+    scripts = apigpio.ScriptCache(pi)
+    blink = 'w p0 1 mils p1 w p0 0 mils p1'
+    await scripts.run(blink, [21, 500])
+    await scripts.run(blink, [22, 250])  # no store
+    ...
+    """
+
+    def __init__(self, pi, known=None, max_scripts=32):
+        """
+        Initialises a cache.
+
+                 pi:= a connected Pi.
+              known:= dict of script hashes to ids, as saved from ids.
+        max_scripts:= maximum number of scripts kept stored, 32 for
+                      an unmodified pigpiod.
+        """
+        self._pi = pi
+        self.max_scripts = max_scripts
+        self._ids = collections.OrderedDict(known or {})
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def ids(self):
+        """The dict of script hashes to ids."""
+        return dict(self._ids)
+
+    @staticmethod
+    def _script_hash(script):
+        if isinstance(script, str):
+            script = script.encode('latin-1')
+        return hashlib.sha1(script).hexdigest()
+
+    async def store(self, script):
+        """
+        Returns the id of a script, storing it on pigpiod if it is not
+        already cached.
+
+        script:= the script text, str or bytes.
+        """
+        key = self._script_hash(script)
+        if key in self._ids:
+            self.hits += 1
+            self._ids.move_to_end(key)
+            return self._ids[key]
+        return await self._store(key, script)
+
+    async def _store(self, key, script):
+        self.misses += 1
+        if isinstance(script, str):
+            script = script.encode('latin-1')
+        if len(self._ids) >= self.max_scripts:
+            await self.evict()
+        while True:
+            res = await _status(self._pi.store_script(script))
+            if res != PI_NO_SCRIPT_ROOM or not await self.evict():
+                break
+        if res < 0:
+            raise ApigpioError(error_text(res), res)
+        for stale in [k for k, i in self._ids.items() if i == res]:
+            # The id was freed behind our back and reused.
+            del self._ids[stale]
+        self._ids[key] = res
+        await _wait_initialised(self._pi, res)
+        return res
+
+    async def run(self, script, params=None):
+        """
+        Runs a script, storing it first if it is not cached.
+
+        script:= the script text, str or bytes.
+        params:= up to 10 parameters required by the script.
+
+        Returns the script id.
+        """
+        script_id = await self.store(script)
+        res = await _status(self._pi.run_script(script_id, params))
+        if res == PI_BAD_SCRIPT_ID:
+            # Deleted behind our back, e.g. pigpiod was restarted.
+            key = self._script_hash(script)
+            del self._ids[key]
+            script_id = await self._store(key, script)
+            res = await _status(self._pi.run_script(script_id, params))
+        if res < 0:
+            raise ApigpioError(error_text(res), res)
+        return script_id
+
+    async def evict(self, count=1):
+        """
+        Deletes up to count of the least recently used scripts which
+        are not running, and returns the number deleted.
+        """
+        deleted = 0
+        for key, script_id in list(self._ids.items()):
+            if deleted >= count:
+                break
+            status, _ = await self._pi.script_status(script_id)
+            if status in (PI_SCRIPT_RUNNING, PI_SCRIPT_WAITING):
+                continue
+            if status >= 0:
+                await self._delete(script_id)
+            del self._ids[key]
+            self.evictions += 1
+            deleted += 1
+        return deleted
+
+    async def clear(self):
+        """Deletes all the scripts of the cache."""
+        for key, script_id in list(self._ids.items()):
+            await self._delete(script_id)
+            del self._ids[key]
+
+    async def _delete(self, script_id):
+        """Deletes a script, which may already be gone."""
+        res = await _status(self._pi.delete_script(script_id))
+        if res < 0 and res != PI_BAD_SCRIPT_ID:
+            raise ApigpioError(error_text(res), res)
@@ -0,0 +1,303 @@
+"""
+Asyncio stream-like access to the serial ports of pigpiod.
+"""
+import abc
+import asyncio
+
+
+class _RingBuffer(object):
+    """
+    A fixed size byte ring buffer, allocated once and reused.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._data = bytearray(capacity)
+        self._view = memoryview(self._data)
+        self._start = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def free(self):
+        return self.capacity - self._size
+
+    def write(self, data):
+        """
+        Appends data, dropping the oldest bytes if there is not enough
+        room.  Returns the number of bytes dropped.
+        """
+        data = memoryview(data).cast('B')
+        dropped = 0
+        if len(data) > self.capacity:
+            dropped = len(data) - self.capacity
+            data = data[dropped:]
+        if len(data) > self.free():
+            lost = len(data) - self.free()
+            self._drop(lost)
+            dropped += lost
+        end = (self._start + self._size) % self.capacity
+        first = min(len(data), self.capacity - end)
+        self._view[end:end + first] = data[:first]
+        self._view[:len(data) - first] = data[first:]
+        self._size += len(data)
+        return dropped
+
+    def _drop(self, n):
+        self._start = (self._start + n) % self.capacity
+        self._size -= n
+
+    def take(self, n):
+        """Removes and returns the n oldest bytes."""
+        n = min(n, self._size)
+        first = min(n, self.capacity - self._start)
+        data = bytes(self._view[self._start:self._start + first])
+        if first < n:
+            data += bytes(self._view[:n - first])
+        self._drop(n)
+        return data
+
+    def find(self, sub, start=0):
+        """
+        Returns the offset of the first occurrence of sub at or after
+        offset start, or -1.
+        """
+        if self._start + self._size > self.capacity:
+            # Wrapped around: rotate the data back to the beginning.
+            self._data[:] = (self._data[self._start:]
+                             + self._data[:self._start])
+            self._start = 0
+        pos = self._data.find(sub, self._start + start,
+                              self._start + self._size)
+        return pos - self._start if pos >= 0 else -1
+
+
+class _PolledStream(abc.ABC):
+    """
+    Base class for the byte streams read from pigpiod.
+    """
+
+    def __init__(self, pi, capacity):
+        self._pi = pi
+        self._buffer = _RingBuffer(capacity)
+
+    @abc.abstractmethod
+    async def _fill(self):
+        """
+        Waits until some data has been added to the ring buffer
+        self._buffer.
+        """
+
+    async def read(self, n=-1):
+        """
+        Reads up to n bytes, or all the buffered bytes if n is -1.
+
+        Waits for data only if none is buffered.
+        """
+        if not len(self._buffer):
+            await self._fill()
+        if n < 0:
+            n = len(self._buffer)
+        return self._buffer.take(n)
+
+    async def readexactly(self, n):
+        """Reads exactly n bytes."""
+        if n > self._buffer.capacity:
+            raise ValueError('cannot read more than the buffer capacity')
+        while len(self._buffer) < n:
+            await self._fill()
+        return self._buffer.take(n)
+
+    async def readuntil(self, separator=b'\n'):
+        """
+        Reads data up to and including the first occurrence of
+        separator.
+        """
+        start = 0
+        while True:
+            pos = self._buffer.find(separator, start)
+            if pos >= 0:
+                return self._buffer.take(pos + len(separator))
+            if not self._buffer.free():
+                raise ValueError('separator not found in a full buffer')
+            start = max(0, len(self._buffer) - len(separator) + 1)
+            await self._fill()
+
+
+class SerialStream(_PolledStream):
+    """
+    A serial device of pigpiod, with asyncio stream-like reads.
+
+    Data is fetched by polling [*serial_read*], every min_poll
+    seconds while data is flowing, backing off up to max_poll seconds
+    while the device is idle.  Available data is read in
+    chunks of up to chunk_size bytes into a reusable buffer and copied
+    to the local ring buffer, reads are then served from that buffer.
+
+    ...
+    ser = await SerialStream.open(pi, '/dev/serial0', 9600)
+    line = await ser.readuntil(b'\\r\\n')
+    await ser.write(b'$PMTK220,1000*1F\\r\\n')
+    await ser.close()
+    ...
+    """
+
+    def __init__(self, pi, handle, min_poll=0.002, max_poll=0.05,
+                 chunk_size=4096, capacity=65536):
+        """
+        Wraps a serial handle.
+
+                pi:= a connected Pi.
+            handle:= >=0 (as returned by a prior call to
+                      [*serial_open*]).
+          min_poll:= polling interval in seconds while data is flowing.
+          max_poll:= maximum polling interval in seconds when idle.
+        chunk_size:= maximum number of bytes fetched by a single read.
+          capacity:= size in bytes of the local buffer.
+        """
+        super().__init__(pi, capacity)
+        self.handle = handle
+        self.min_poll = min_poll
+        self.max_poll = max_poll
+        self.chunk_size = chunk_size
+        self._interval = min_poll
+        self._rx = bytearray(chunk_size)
+
+    @classmethod
+    async def open(cls, pi, tty, baud, ser_flags=0, **kwargs):
+        """
+        Opens the serial device tty and returns its stream, see
+        [*serial_open*].
+        """
+        handle = await pi.serial_open(tty, baud, ser_flags)
+        return cls(pi, handle, **kwargs)
+
+    async def _fill(self):
+        while True:
+            # A single round trip: SERR returns no data when none is
+            # available.
+            count, data = await self._pi.serial_read(
+                self.handle, min(self._buffer.free(), self.chunk_size),
+                self._rx)
+            if count > 0:
+                self._buffer.write(data)
+                self._interval = self.min_poll
+                return
+            await asyncio.sleep(self._interval)
+            self._interval = min(self._interval * 2, self.max_poll)
+
+    async def write(self, data):
+        """Writes the data bytes to the device."""
+        return await self._pi.serial_write(self.handle, data)
+
+    async def close(self):
+        """Closes the serial device."""
+        return await self._pi.serial_close(self.handle)
+
+
+class BitBangSerialStream(_PolledStream):
+    """
+    Bit bang serial data received on a GPIO, with asyncio stream-like
+    reads.
+
+    A background task drains the pigpiod cyclic buffer with
+    [*bb_serial_read_into*] into a reusable ring buffer.  The polling
+    interval is derived from the baud rate so that a poll fetches
+    about poll_chars characters, within 1 ms and 100 ms.
+
+    If the reader does not keep up the oldest buffered bytes are
+    dropped.  The following counters show whether polling and reading
+    are fast enough:
+
+    . .
+        polls: number of reads from pigpiod.
+     received: number of bytes received.
+    full_polls: number of polls which filled the read buffer, more data
+                was probably waiting and the pigpiod buffer may have
+                overflowed.
+      dropped: number of bytes dropped because the ring buffer was full.
+    . .
+
+    ...
+    bb = await BitBangSerialStream.open(pi, 4, 9600)
+    line = await bb.readuntil(b'\\n')
+    print(bb.full_polls, bb.dropped)
+    await bb.close()
+    ...
+    """
+
+    # largest read accepted by pigpiod for a bit bang serial gpio
+    READ_SIZE = 8192
+
+    def __init__(self, pi, gpio, baud, bb_bits=8, poll_chars=256,
+                 capacity=65536):
+        """
+        Starts draining a GPIO opened with [*bb_serial_read_open*].
+
+                pi:= a connected Pi.
+              gpio:= 0-31, the GPIO used.
+              baud:= the baud rate given to [*bb_serial_read_open*].
+           bb_bits:= the data bits given to [*bb_serial_read_open*].
+        poll_chars:= number of characters received between polls.
+          capacity:= size in bytes of the ring buffer.
+        """
+        super().__init__(pi, capacity)
+        self.gpio = gpio
+        char_time = (bb_bits + 2) / baud
+        self.interval = min(max(poll_chars * char_time, 0.001), 0.1)
+        self.polls = 0
+        self.received = 0
+        self.full_polls = 0
+        self.dropped = 0
+        self._rx = bytearray(self.READ_SIZE)
+        self._data = asyncio.Event()
+        self._error = None
+        self._task = asyncio.ensure_future(self._run())
+
+    @classmethod
+    async def open(cls, pi, gpio, baud, bb_bits=8, invert=False, **kwargs):
+        """
+        Opens gpio for bit bang serial reading and returns its stream,
+        see [*bb_serial_read_open*] and [*bb_serial_invert*].
+        """
+        await pi.bb_serial_read_open(gpio, baud, bb_bits)
+        if invert:
+            await pi.bb_serial_invert(gpio, 1)
+        return cls(pi, gpio, baud, bb_bits, **kwargs)
+
+    async def _run(self):
+        rx = memoryview(self._rx)
+        try:
+            while True:
+                count = await self._pi.bb_serial_read_into(self.gpio, rx)
+                self.polls += 1
+                if count > 0:
+                    self.received += count
+                    if count == len(rx):
+                        self.full_polls += 1
+                    self.dropped += self._buffer.write(rx[:count])
+                    self._data.set()
+                await asyncio.sleep(self.interval)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._error = e
+            self._data.set()
+
+    async def _fill(self):
+        if self._error is not None:
+            raise self._error
+        self._data.clear()
+        await self._data.wait()
+        if self._error is not None:
+            raise self._error
+
+    async def close(self):
+        """Stops draining and closes the GPIO for bit bang reading."""
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        return await self._pi.bb_serial_read_close(self.gpio)
@@ -0,0 +1,136 @@
+"""
+A blocking interface to a Pi for synchronous code.
+"""
+import asyncio
+import concurrent.futures
+import functools
+import inspect
+import threading
+
+from .apigpio import Pi
+
+
+async def _call(func, args, kwargs):
+    return func(*args, **kwargs)
+
+
+def _coroutine(func, args, kwargs):
+    """Returns a coroutine running a Pi method, plain or not."""
+    if inspect.iscoroutinefunction(func):
+        return func(*args, **kwargs)
+    # Plain methods touch the loop state, run them in its thread.
+    return _call(func, args, kwargs)
+
+
+class SyncPi(object):
+    """
+    A Pi driven from synchronous code, from any number of threads.
+
+    The Pi, its connection and its event loop live in a background
+    thread for the lifetime of the SyncPi, each method call being
+    handed to that loop and waited for, so that a call costs a thread
+    hand-off and the command round trip, without any per call loop or
+    connection setup.
+
+    Every Pi method is available with the same arguments and blocks
+    until its result is available.  Callbacks run in the background
+    thread.
+
+    ...
+    with apigpio.SyncPi(('192.168.1.3', 8888)) as pi:
+        pi.set_mode(17, apigpio.OUTPUT)
+        pi.write(17, 1)
+        levels = pi.batch([('read', 4), ('read', 5), ('write', 17, 0)])
+    ...
+    """
+
+    def __init__(self, address, timeout=None):
+        """
+        Starts the background thread and connects.
+
+        address:= the (address, port) of pigpiod.
+        timeout:= seconds a call may block before raising
+                  concurrent.futures.TimeoutError, None to wait
+                  forever.
+        """
+        self.timeout = timeout
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever,
+                                        name='apigpio', daemon=True)
+        self._thread.start()
+        try:
+            self.pi = self._run(self._connect(address))
+        except BaseException:
+            self._stop_loop()
+            raise
+
+    async def _connect(self, address):
+        pi = Pi(self._loop)
+        await pi.connect(address)
+        return pi
+
+    def _run(self, coro):
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        try:
+            return future.result(self.timeout)
+        except concurrent.futures.TimeoutError:
+            # Do not leave the call running on the loop.
+            future.cancel()
+            raise
+
+    def __getattr__(self, name):
+        if name == 'pi':
+            raise AttributeError(name)
+        func = getattr(self.pi, name)
+        if not callable(func):
+            return func
+
+        def bridge(*args, **kwargs):
+            return self._run(_coroutine(func, args, kwargs))
+        functools.update_wrapper(bridge, func)
+        self.__dict__[name] = bridge
+        return bridge
+
+    def batch(self, calls, return_exceptions=False):
+        """
+        Runs several Pi methods in a single hand-off to the loop.
+
+                    calls:= a list of (method name, arg, ...) tuples.
+        return_exceptions:= True to return the exceptions raised in
+                            place of the results, False to raise the
+                            first one.
+
+        The calls are started in order and run concurrently on the
+        loop.  Returns the list of their results.
+
+        ...
+        pi.batch([('write', 17, 1), ('write', 18, 0), ('read', 4)])
+        [0, 0, 1]
+        ...
+        """
+        return self._run(self._batch(calls, return_exceptions))
+
+    async def _batch(self, calls, return_exceptions):
+        return await asyncio.gather(
+            *[_coroutine(getattr(self.pi, call[0]), call[1:], {})
+              for call in calls],
+            return_exceptions=return_exceptions)
+
+    def close(self):
+        """Disconnects and stops the background thread."""
+        if self._thread.is_alive():
+            try:
+                self._run(self.pi.stop())
+            finally:
+                self._stop_loop()
+
+    def _stop_loop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
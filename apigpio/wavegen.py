@@ -0,0 +1,187 @@
+"""
+Vectorized waveform generators.
+
+The functions of this module build pulse arrays with NumPy in a single
+pass, without creating any Pulse object.  A pulse array is a (n, 3)
+uint32 array holding, for each pulse, the gpios switched on, the gpios
+switched off and the delay in microseconds before the next pulse.  It
+can be given directly to Pi.wave_add_generic.
+
+NumPy is an optional dependency of apigpio which is only required by
+this module.
+
+...
+from apigpio import wavegen
+
+pulses = wavegen.pwm([17, 18], [[250, 750], [500, 500]], 1000)
+await pi.wave_add_generic(pulses)
+wid = await pi.wave_create()
+...
+"""
+import numpy as np
+
+
+def gpio_masks(gpios):
+    """
+    Returns the array of the bit masks of gpios.
+
+    gpios:= sequence of gpios 0-31.
+    """
+    gpios = np.asarray(gpios, dtype=np.uint32)
+    if np.any(gpios > 31):
+        raise ValueError('gpio not 0-31')
+    return np.left_shift(np.uint32(1), gpios)
+
+
+def edges_to_pulses(times, on, off, length=None):
+    """
+    Merges timed gpio changes into a pulse array.
+
+     times:= array of the times of the changes, in microseconds from
+             the start of the waveform.
+        on:= array of the gpio masks switched on at each time.
+       off:= array of the gpio masks switched off at each time.
+    length:= length of the waveform in microseconds, by default the
+             time of the last change.
+
+    The changes may be given in any order.  All the changes happening
+    at the same time are merged into a single pulse.  If the first
+    change is not at time 0, the waveform starts with a delay-only
+    pulse.
+
+    Returns a (n, 3) uint32 pulse array.
+    """
+    times = np.asarray(times, dtype=np.int64).ravel()
+    on = np.broadcast_to(np.asarray(on, dtype=np.uint32), times.shape)
+    off = np.broadcast_to(np.asarray(off, dtype=np.uint32), times.shape)
+    if not times.size:
+        return np.zeros((0, 3), dtype=np.uint32)
+    if times.min() < 0:
+        raise ValueError('negative change time')
+
+    order = np.argsort(times, kind='stable')
+    times = times[order]
+    first = np.flatnonzero(np.r_[True, times[1:] != times[:-1]])
+    starts = times[first]
+    if length is None:
+        length = starts[-1]
+    elif length < starts[-1]:
+        raise ValueError('length shorter than the last change')
+
+    lead = 1 if starts[0] > 0 else 0
+    pulses = np.zeros((len(starts) + lead, 3), dtype=np.uint32)
+    if lead:
+        pulses[0, 2] = starts[0]
+    pulses[lead:, 0] = np.bitwise_or.reduceat(on[order], first)
+    pulses[lead:, 1] = np.bitwise_or.reduceat(off[order], first)
+    pulses[lead:, 2] = np.diff(np.r_[starts, length])
+    return pulses
+
+
+def pwm(gpios, widths, period):
+    """
+    Builds a multi-channel software PWM pulse train.
+
+     gpios:= sequence of n gpios 0-31.
+    widths:= (cycles, n) array of the high times in microseconds of
+             each gpio for each PWM period, 0 (off) to period (on).
+    period:= the PWM period in microseconds.
+
+    All channels start their period at the same time.  A 1-D widths
+    array is a single period.
+
+    Returns a (n, 3) uint32 pulse array of cycles * period
+    microseconds.
+
+    ...
+    # gpio 17 ramping up while gpio 18 ramps down, 1 kHz
+    ramp = np.linspace(0, 1000, 200)
+    pulses = wavegen.pwm([17, 18], np.c_[ramp, 1000 - ramp], 1000)
+    ...
+    """
+    masks = gpio_masks(gpios)
+    widths = np.atleast_2d(np.asarray(widths, dtype=np.int64))
+    if widths.shape[1] != len(masks):
+        raise ValueError('widths must have one column per gpio')
+    if np.any(widths < 0) or np.any(widths > period):
+        raise ValueError('width not 0-period')
+
+    cycles = widths.shape[0]
+    starts = np.broadcast_to(
+        (np.arange(cycles, dtype=np.int64) * period)[:, None], widths.shape)
+    masks = np.broadcast_to(masks, widths.shape)
+    zero = np.uint32(0)
+
+    # At the start of each period a gpio is switched on, unless its
+    # width is 0, and switched off again after its width.
+    high = widths > 0
+    falls = high & (widths < period)
+    times = np.concatenate((starts.ravel(), (starts + widths)[falls]))
+    on = np.concatenate((np.where(high, masks, zero).ravel(),
+                         np.zeros(np.count_nonzero(falls), np.uint32)))
+    off = np.concatenate((np.where(high, zero, masks).ravel(), masks[falls]))
+    return edges_to_pulses(times, on, off, cycles * period)
+
+
+def servo(gpios, widths, frame=20000):
+    """
+    Builds a servo pulse sequence for several servos.
+
+     gpios:= sequence of n gpios 0-31.
+    widths:= (frames, n) array of the servo pulsewidths in
+             microseconds, 0 (off) or 500-2500.
+     frame:= the servo frame length in microseconds, default 20000.
+
+    Returns a (n, 3) uint32 pulse array of frames * frame microseconds.
+
+    ...
+    # sweep a servo on gpio 4 over 2 seconds
+    sweep = np.linspace(1000, 2000, 100)[:, None]
+    pulses = wavegen.servo([4], sweep)
+    ...
+    """
+    widths = np.asarray(widths)
+    if np.any((widths != 0) & ((widths < 500) | (widths > 2500))):
+        raise ValueError('pulsewidth not 0 or 500-2500')
+    return pwm(gpios, widths, frame)
+
+
+def ppm(gpio, channels, frame=22500, pulse=300):
+    """
+    Builds RC PPM (pulse position modulation) frames.
+
+        gpio:= the gpio 0-31 to transmit on.
+    channels:= (frames, n) array of the channel values in microseconds,
+               typically 1000-2000, each being the interval between
+               the starts of two consecutive marker pulses.
+       frame:= the PPM frame length in microseconds, default 22500.
+       pulse:= the marker pulse length in microseconds, default 300.
+
+    Each frame is made of n + 1 marker pulses followed by the sync gap
+    filling the rest of the frame.
+
+    Returns a (n, 3) uint32 pulse array of frames * frame microseconds.
+
+    ...
+    pulses = wavegen.ppm(18, [[1500] * 8] * 50)
+    ...
+    """
+    mask = gpio_masks([gpio])[0]
+    channels = np.atleast_2d(np.asarray(channels, dtype=np.int64))
+    if np.any(channels <= pulse):
+        raise ValueError('channel value not greater than the pulse')
+    offsets = np.zeros((channels.shape[0], channels.shape[1] + 1),
+                       dtype=np.int64)
+    np.cumsum(channels, axis=1, out=offsets[:, 1:])
+    if np.any(offsets[:, -1] + pulse >= frame):
+        raise ValueError('channels do not fit in the frame')
+
+    marks = (offsets
+             + (np.arange(channels.shape[0], dtype=np.int64) * frame)[:, None])
+    marks = marks.ravel()
+    times = np.concatenate((marks, marks + pulse))
+    on = np.concatenate((np.full(marks.shape, mask, np.uint32),
+                         np.zeros(marks.shape, np.uint32)))
+    off = np.concatenate((np.zeros(marks.shape, np.uint32),
+                          np.full(marks.shape, mask, np.uint32)))
+    return edges_to_pulses(times, on, off, channels.shape[0] * frame)
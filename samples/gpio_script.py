@@ -8,17 +8,16 @@ async def start(pi, address, gpio):
 
     await pi.set_mode(gpio, apigpio.OUTPUT)
 
-    # Create the script.
-    script = 'w {e} 1 mils 500 w {e} 0 mils 500 w {e} 1 mils 500 w {e} 0'\
-        .format(e=gpio)
-    sc_id = await pi.store_script(script)
+    # The script is stored on the first run only, later runs and
+    # reconnects reuse its id.
+    scripts = apigpio.ScriptCache(pi)
+    script = 'w p0 1 mils p1 w p0 0 mils p1 w p0 1 mils p1 w p0 0'
 
-    # Run the script.
-    await pi.run_script(sc_id)
+    for period in (500, 250, 100):
+        await scripts.run(script, [gpio, period])
+        await asyncio.sleep(2)
 
-    await asyncio.sleep(5)
-
-    await pi.delete_script(sc_id)
+    await scripts.clear()
 
 async def main():
     address = ('192.168.1.3', 8888)
@@ -39,8 +39,7 @@ async def start(pi, address, gpio, cycles=5, period=1.0, duty=0.5):
         return
 
     await pi.wave_send_once(wid)
-    while (await pi.wave_tx_busy()):
-        await asyncio.sleep(0.1)
+    await pi.wave_wait(wid)
     await pi.wave_delete(wid)
 
 async def main():
@@ -0,0 +1,232 @@
+'''
+Notification load generator.
+
+Pushes notification reports to a Pi from a local pigpiod stand-in, at
+increasing rates, to find how many reports per second the notification
+task and the callbacks can sustain.
+
+Each step sends reports at a fixed rate for a few seconds, the rate
+then grows by a factor until a step loses reports (sequence gaps, the
+stand-in dropping reports like pigpiod when the client does not read
+fast enough) or exceeds the latency target.  The last step within the
+targets is the saturation point of the callback configuration.
+
+The reports either toggle a gpio or are taken from a recording made
+with apigpio.recording, whose reports are cycled and sent at a
+multiple of their recorded mean rate.
+
+    python notification_load.py --callbacks 4 --work 20
+    python notification_load.py --recording site.rec --factor 1.5
+'''
+import argparse
+import asyncio
+import struct
+import threading
+import time
+
+import apigpio
+from apigpio import recording
+from apigpio.metrics import LatencyHistogram
+
+# Bytes queued for the client before the stand-in drops reports.
+BUFFER_LIMIT = 65536
+
+
+def micros():
+    return int(time.perf_counter() * 1e6) & 0xFFFFFFFF
+
+
+class StandIn(object):
+    '''
+    A minimal pigpiod: every command is answered with 0, and reports
+    are pushed on the notification socket on request.
+
+    It runs its own event loop in a thread, so that generating the
+    reports does not compete with the Pi under test.
+    '''
+
+    def __init__(self, reports):
+        '''
+        reports:= list of (flags, level) pairs, cycled.
+        '''
+        self.reports = reports
+        self.seq = 0
+        self._notify = None
+        self._ready = threading.Event()
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._run, daemon=True).start()
+        self._ready.wait()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._client, '127.0.0.1', 0))
+        self.address = self._server.sockets[0].getsockname()[:2]
+        self._ready.set()
+        self._loop.run_forever()
+
+    async def _client(self, reader, writer):
+        try:
+            while True:
+                cmd, p1, p2, p3 = struct.unpack(
+                    'IIII', await reader.readexactly(16))
+                if p3:
+                    await reader.readexactly(p3)
+                writer.write(struct.pack('IIII', cmd, p1, p2, 0))
+                if cmd == 99:  # NOIB
+                    self._notify = writer
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+
+    async def push(self, rate, duration):
+        '''
+        Sends reports at rate per second for duration seconds from the
+        caller's event loop.  Returns the numbers of reports sent and
+        dropped.
+        '''
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(
+            self._push(rate, duration), self._loop))
+
+    async def _push(self, rate, duration):
+        writer = self._notify
+        start = time.perf_counter()
+        sent = dropped = 0
+        while True:
+            elapsed = time.perf_counter() - start
+            if elapsed >= duration:
+                return sent, dropped
+            batch = bytearray()
+            for _ in range(int(elapsed * rate) - sent - dropped):
+                flags, level = self.reports[self.seq % len(self.reports)]
+                if (writer.transport.get_write_buffer_size() + len(batch)
+                        > BUFFER_LIMIT):
+                    dropped += 1
+                else:
+                    batch += struct.pack('HHII', self.seq & 0xFFFF, flags,
+                                         micros(), level)
+                    sent += 1
+                self.seq += 1
+            writer.write(batch)
+            await asyncio.sleep(0.001)
+
+
+class Consumer(object):
+    '''
+    The callbacks under test: each one busy waits work microseconds,
+    the first one also measures the report latency.
+    '''
+
+    def __init__(self, work):
+        self.work = work / 1e6
+        self.received = 0
+        self.latency = LatencyHistogram()
+
+    def first(self, gpio, level, tick):
+        self.received += 1
+        self.latency.record(((micros() - tick) & 0xFFFFFFFF) / 1e6)
+        self.other(gpio, level, tick)
+
+    def other(self, gpio, level, tick):
+        end = time.perf_counter() + self.work
+        while time.perf_counter() < end:
+            pass
+
+
+def load_reports(path):
+    '''
+    Returns the (flags, level) pairs and the mean rate of the reports
+    of a recording.
+    '''
+    frames = [(t, data) for kind, t, data in recording.read_recording(path)
+              if kind == recording.NOTIFY]
+    if len(frames) < 2:
+        raise SystemExit('{} holds fewer than 2 reports'.format(path))
+    reports = [struct.unpack('HHII', data)[1::2] for _, data in frames]
+    return reports, (len(frames) - 1) / (frames[-1][0] - frames[0][0])
+
+
+async def step(pi, stand_in, consumer, rate, duration):
+    gaps = pi.notification_gaps()
+    consumer.received = 0
+    consumer.latency = LatencyHistogram()
+    sent, dropped = await stand_in.push(rate, duration)
+    # Let the client drain what is still queued.
+    while True:
+        received = consumer.received
+        await asyncio.sleep(0.2)
+        if consumer.received == received:
+            break
+    return sent, dropped, pi.notification_gaps() - gaps
+
+
+async def start(args):
+    if args.recording:
+        reports, base_rate = load_reports(args.recording)
+    else:
+        bit = 1 << args.gpio
+        reports, base_rate = [(0, bit), (0, 0)], args.start
+    changed = 0
+    for (_, a), (_, b) in zip(reports, reports[1:] + reports[:1]):
+        changed |= a ^ b
+    gpios = [g for g in range(32) if changed & (1 << g)]
+
+    stand_in = StandIn(reports)
+    pi = apigpio.Pi()
+    await pi.connect(stand_in.address)
+    consumer = Consumer(args.work)
+    for i in range(args.callbacks):
+        for g in gpios:
+            func = consumer.first if i == 0 and g == gpios[0] \
+                else consumer.other
+            await pi.add_callback(g, apigpio.EITHER_EDGE, func)
+
+    print('{:>10} {:>9} {:>9} {:>6} {:>9} {:>9}'.format(
+        'rate/s', 'sent', 'received', 'gaps', 'p50 ms', 'p99 ms'))
+    saturation = None
+    multiple = 1.0
+    while True:
+        rate = base_rate * multiple
+        sent, dropped, gaps = await step(pi, stand_in, consumer, rate,
+                                         args.step)
+        p50 = consumer.latency.percentile(50) * 1e3
+        p99 = consumer.latency.percentile(99) * 1e3
+        print('{:>10.0f} {:>9} {:>9} {:>6} {:>9.2f} {:>9.2f}'.format(
+            rate, sent, consumer.received, gaps, p50, p99))
+        if gaps or dropped or p99 > args.max_latency:
+            break
+        saturation = rate
+        multiple *= args.factor
+
+    if saturation is None:
+        print('saturated at the first step')
+    else:
+        print('saturation point: {:.0f} reports/s with {} callback(s) of'
+              ' {} us'.format(saturation, args.callbacks * len(gpios),
+                              args.work))
+    await pi.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--recording', help='replay the reports of a '
+                        'recording instead of toggling a gpio')
+    parser.add_argument('--gpio', type=int, default=4,
+                        help='gpio toggled by the synthetic reports')
+    parser.add_argument('--start', type=float, default=1000,
+                        help='synthetic reports per second of the first '
+                        'step')
+    parser.add_argument('--factor', type=float, default=2,
+                        help='rate multiplier between steps')
+    parser.add_argument('--step', type=float, default=2,
+                        help='duration of a step in seconds')
+    parser.add_argument('--callbacks', type=int, default=1,
+                        help='callbacks registered on each gpio')
+    parser.add_argument('--work', type=float, default=0,
+                        help='busy time of each callback in microseconds')
+    parser.add_argument('--max-latency', type=float, default=10,
+                        help='p99 latency target in milliseconds')
+    asyncio.run(start(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+import asyncio
+import time
+import apigpio
+
+SPI_CHANNEL = 0
+SPI_BAUD = 1000000
+TRANSFERS = 5000
+SIZE = 3
+
+
+async def start(pi, address, channel=SPI_CHANNEL, count=TRANSFERS, size=SIZE):
+    '''
+    Measures the SPI transfer rate, as when sampling an ADC, with
+    spi_xfer and with spi_xfer_into reusing a preallocated buffer.
+
+    address:= the (host, port) tuple used to connect to pigpiod
+    channel:= the SPI channel
+      count:= the number of transfers
+       size:= the number of bytes per transfer
+    '''
+    await pi.connect(address)
+
+    h = await pi.spi_open(channel, SPI_BAUD)
+    tx = bytes(size)
+    rx = bytearray(size)
+    try:
+        t0 = time.perf_counter()
+        for i in range(count):
+            await pi.spi_xfer(h, tx)
+        t1 = time.perf_counter()
+        for i in range(count):
+            await pi.spi_xfer_into(h, tx, rx)
+        t2 = time.perf_counter()
+    finally:
+        await pi.spi_close(h)
+
+    for name, elapsed in (('spi_xfer', t1 - t0), ('spi_xfer_into', t2 - t1)):
+        print('{}: {} transfers of {} bytes in {:.3f} s ({:.0f} transfers/s)'
+              .format(name, count, size, elapsed, count / elapsed))
+
+async def main():
+    address = ('192.168.1.3', 8888)
+    pi = apigpio.Pi()
+    await start(pi, address)
+
+if __name__ == '__main__':
+    asyncio.run(main())
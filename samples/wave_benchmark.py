@@ -0,0 +1,57 @@
+import asyncio
+import time
+import apigpio
+
+LED_GPIO = 21
+PULSES = 100000
+DELAY_USEC = 5
+
+
+def build_pulses(gpio, count):
+    '''
+    Builds a square wave of count pulses on gpio.
+    '''
+    on = apigpio.Pulse(1<<gpio, 0, DELAY_USEC)
+    off = apigpio.Pulse(0, 1<<gpio, DELAY_USEC)
+    return [on if i % 2 == 0 else off for i in range(count)]
+
+
+async def start(pi, address, gpio, count=PULSES):
+    '''
+    Measures how fast large waveforms can be built on pigpiod.
+
+    pigpiod limits the number of pulses in a single waveform (see
+    wave_get_max_pulses), so the pulses are sent in batches of that size,
+    each batch being added and created as one waveform.
+
+    address:= the (host, port) tuple used to connect to pigpiod
+       gpio:= the GPIO used in the waveform
+      count:= the total number of pulses to build
+    '''
+    await pi.connect(address)
+
+    await pi.set_mode(gpio, apigpio.OUTPUT)
+    max_pulses = await pi.wave_get_max_pulses()
+
+    t0 = time.perf_counter()
+    pulses = build_pulses(gpio, count)
+    t1 = time.perf_counter()
+    print('built {} pulses in {:.3f} s'.format(count, t1 - t0))
+
+    await pi.wave_clear()
+    for i in range(0, count, max_pulses):
+        await pi.wave_add_generic(pulses[i:i + max_pulses])
+        wid = await pi.wave_create()
+        await pi.wave_delete(wid)
+    t2 = time.perf_counter()
+    print('sent {} pulses in batches of {} in {:.3f} s ({:.0f} pulses/s)'
+          .format(count, max_pulses, t2 - t1, count / (t2 - t1)))
+    await pi.wave_clear()
+
+async def main():
+    address = ('192.168.1.3', 8888)
+    pi = apigpio.Pi()
+    await start(pi, address, LED_GPIO)
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -27,5 +27,6 @@ setup(name='apigpio-nowls',
       author_email='pierre.rust@gmail.com',
       url='https://github.com/nowls/apigpio',
       keywords=['gpio', 'pigpio', 'asyncio', 'raspberry'],
-      packages=find_packages()
+      packages=find_packages(),
+      extras_require={'numpy': ['numpy']}
       )